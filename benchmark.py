@@ -0,0 +1,359 @@
+"""
+Micro-benchmarks for the schedule bot.
+
+Run offline against the saved pages:
+    python benchmark.py [parser] [backends] [models] [database] [render] [lookup] [webhook]
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiogram import Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+from bs4 import BeautifulSoup
+
+from database import AsyncDatabase, Database
+from fake_telegram import FakeTelegram
+from groups import GroupIndex, group_key
+from lookup import DayIndex, normalize_room
+from models import DaySchedule
+from parser import get_target_date, index_schedule_table, parse_day_page, parse_day_schedule, parse_schedule_html
+from renderer import MessageRenderer, render_lessons
+from webhook import UpdateWorkers, build_webhook_app
+
+
+FIXTURE = "working_schedule.html"
+
+
+def measure(fn, repeat: int = 20) -> dict:
+    """
+    Time a function and record its memory allocations.
+    
+    Args:
+        fn: Function without arguments to measure
+        repeat: Number of timed runs
+    
+    Returns:
+        Dict with median and p95 time in ms and peak allocated KiB
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    timings.sort()
+    return {
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "peak_kib": peak / 1024
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<28} median {result['median_ms']:8.2f} ms   "
+        f"p95 {result['p95_ms']:8.2f} ms   peak {result['peak_kib']:9.1f} KiB"
+    )
+
+
+def bench_parser():
+    """Cost of building the column index and extracting groups."""
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    
+    soup = BeautifulSoup(content, 'lxml')
+    table = soup.find('table', class_='border')
+    groups = list(index_schedule_table(table))
+    
+    print(f"{FIXTURE}: {len(content) / 1024:.0f} KiB, {len(groups)} groups\n")
+    report("soup (lxml)", measure(lambda: BeautifulSoup(content, 'lxml')))
+    report("column index", measure(lambda: index_schedule_table(table)))
+    report("all groups, one pass", measure(lambda: parse_day_schedule(table)))
+    report("one group", measure(lambda: parse_schedule_html(table, groups[-1])))
+    report(
+        "all groups, one by one",
+        measure(lambda: [parse_schedule_html(table, group) for group in groups], repeat=5)
+    )
+
+
+def bench_backends():
+    """Whole page parse with each parser backend."""
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    
+    for backend in ("bs4", "lxml"):
+        report(f"parse_day_page ({backend})", measure(lambda: parse_day_page(content, backend=backend)))
+
+
+def retained_kib(build) -> float:
+    """KiB still allocated by the object that build() returns."""
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024
+
+
+def bench_models(days: int = 100):
+    """Memory of a semester of cached days: dict lessons vs Lesson models."""
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    
+    def fresh(text: str) -> str:
+        # Every parse used to produce its own copy of each string
+        return (text + " ")[:-1]
+    
+    def semester_of_dicts():
+        semester = []
+        for _ in range(days):
+            groups = parse_day_page(content)
+            semester.append({
+                group: [
+                    {key: fresh(value) for key, value in lesson.to_dict().items()}
+                    for lesson in group_day
+                ]
+                for group, group_day in groups.items()
+            })
+        return semester
+    
+    def semester_of_models():
+        return [parse_day_page(content) for _ in range(days)]
+    
+    lessons = sum(len(group_day) for group_day in parse_day_page(content).values())
+    print(f"{days} days x {lessons} lessons\n")
+    print(f"{'dict lessons':<28} {retained_kib(semester_of_dicts):9.1f} KiB")
+    print(f"{'Lesson models':<28} {retained_kib(semester_of_models):9.1f} KiB")
+
+
+def percentiles(name: str, timings: list, total: float):
+    timings.sort()
+    print(
+        f"{name:<28} p50 {statistics.median(timings) * 1000:7.3f} ms   "
+        f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:7.3f} ms   "
+        f"{len(timings) / total:9.0f} ops/s"
+    )
+
+
+def bench_database(operations: int = 5000, concurrency: int = 100, users: int = 2000):
+    """Latency and throughput of reads and upserts on the users table."""
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    Database(path).close()
+    
+    def connect_per_call_read(user_id):
+        with sqlite3.connect(path) as conn:
+            conn.execute("SELECT default_group FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    
+    def connect_per_call_upsert(user_id):
+        with sqlite3.connect(path) as conn:
+            conn.execute("""
+                INSERT INTO users (user_id, default_group) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET default_group = ?
+            """, (user_id, "ИС-1-24", "ИС-1-24"))
+            conn.commit()
+    
+    def run_sync(name, fn):
+        timings = []
+        started = time.perf_counter()
+        for _ in range(operations // 5):
+            call_started = time.perf_counter()
+            fn(random.randrange(users))
+            timings.append(time.perf_counter() - call_started)
+        percentiles(name, timings, time.perf_counter() - started)
+    
+    run_sync("read, connect per call", connect_per_call_read)
+    run_sync("upsert, connect per call", connect_per_call_upsert)
+    
+    async def run_async(name, call, concurrency):
+        timings = []
+        
+        async def client(count):
+            for _ in range(count):
+                call_started = time.perf_counter()
+                await call(random.randrange(users))
+                timings.append(time.perf_counter() - call_started)
+        
+        started = time.perf_counter()
+        await asyncio.gather(*[client(operations // concurrency) for _ in range(concurrency)])
+        percentiles(name, timings, time.perf_counter() - started)
+    
+    async def run_all():
+        db = AsyncDatabase(Database(path))
+        for clients in (1, concurrency):
+            await run_async(
+                f"upsert, async x{clients}",
+                lambda user_id: db.set_default_group(user_id, "ИС-1-24"),
+                clients
+            )
+            await run_async(f"read, async x{clients}", db.get_default_group, clients)
+        await db.close()
+    
+    asyncio.run(run_all())
+
+
+def bench_render(requests: int = 1000):
+    """Schedule messages for random groups: rendered every time vs cached."""
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    
+    day_schedule = DaySchedule(get_target_date(1), parse_day_page(content))
+    groups = list(day_schedule.groups)
+    picks = [random.choice(groups) for _ in range(requests)]
+    renderer = MessageRenderer()
+    
+    def uncached():
+        for group in picks:
+            render_lessons(day_schedule.lessons(group), group, "завтра", "01/01/2025", "Markdown")
+    
+    def cached():
+        for group in picks:
+            renderer.render(day_schedule, group, 1, parse_mode="Markdown")
+    
+    print(f"{requests} requests over {len(groups)} groups\n")
+    report("render every time", measure(uncached))
+    report("rendered-message cache", measure(cached))
+
+
+def bench_lookup(queries: int = 1000):
+    """Teacher lookups: scanning every group vs the day's inverted index; free rooms; group search."""
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    
+    day_schedule = DaySchedule(get_target_date(1), parse_day_page(content))
+    index = DayIndex(day_schedule)
+    picks = [random.choice(index.teachers) for _ in range(queries)]
+    
+    def scan():
+        for name in picks:
+            [
+                (group, lesson)
+                for group, group_day in day_schedule.groups.items()
+                for lesson in group_day
+                if lesson.teacher == name
+            ]
+    
+    def indexed():
+        for name in picks:
+            index.teacher_lessons(name)
+    
+    print(f"{queries} lookups over {len(index.teachers)} teachers\n")
+    report("build index", measure(lambda: DayIndex(day_schedule)))
+    report("scan all groups", measure(scan))
+    report("inverted index", measure(indexed))
+    report("prefix search", measure(lambda: [index.search_teachers(name[:3]) for name in picks]))
+    
+    rooms = {normalize_room(room): room for room in index.rooms}
+    report(
+        "free rooms, every pair",
+        measure(lambda: [index.occupancy.free_rooms([pair], rooms) for pair in range(1, 7)])
+    )
+    
+    # Inline queries: group prefix search as the user types
+    groups = list(day_schedule.groups)
+    group_index = GroupIndex(groups)
+    typed = [random.choice(groups)[:random.randint(1, 5)] for _ in range(queries)]
+    report(
+        "group prefix, scan",
+        measure(lambda: [
+            [group for group in groups if group_key(group).startswith(group_key(query))][:10]
+            for query in typed
+        ])
+    )
+    report("group prefix, sorted keys", measure(lambda: [group_index.search(query) for query in typed]))
+
+
+def bench_webhook(updates: int = 200, burst: int = 50):
+    """Update-to-reply latency against a local fake Telegram: polling vs webhook."""
+    
+    def echo_dispatcher() -> Dispatcher:
+        router = Router()
+        
+        @router.message()
+        async def echo(message: Message):
+            await message.answer(f"re: {message.text}")
+        
+        dp = Dispatcher()
+        dp.update.outer_middleware(UpdateWorkers())
+        dp.include_router(router)
+        return dp
+    
+    async def measure_replies(name, fake, prefix):
+        # One update at a time, then a burst sent together
+        timings = []
+        started = time.perf_counter()
+        for number in range(updates):
+            pushed = time.perf_counter()
+            await fake.push_message(f"{prefix} {number}")
+            timings.append(await fake.wait_reply(f"re: {prefix} {number}") - pushed)
+        percentiles(f"{name}, one by one", timings, time.perf_counter() - started)
+        
+        async def one(number):
+            pushed = time.perf_counter()
+            await fake.push_message(f"{prefix} burst {number}")
+            return await fake.wait_reply(f"re: {prefix} burst {number}") - pushed
+        
+        started = time.perf_counter()
+        timings = await asyncio.gather(*[one(number) for number in range(burst)])
+        percentiles(f"{name}, burst x{burst}", list(timings), time.perf_counter() - started)
+    
+    async def polling():
+        fake = FakeTelegram(port=8091)
+        await fake.start()
+        dp = echo_dispatcher()
+        task = asyncio.create_task(dp.start_polling(fake.bot(), handle_signals=False))
+        await fake.push_message("warmup")
+        await fake.wait_reply("re: warmup")
+        await measure_replies("polling", fake, "poll")
+        await dp.stop_polling()
+        await task
+        await fake.stop()
+    
+    async def webhook():
+        fake = FakeTelegram(port=8092)
+        await fake.start()
+        bot = fake.bot()
+        runner = web.AppRunner(build_webhook_app(bot, echo_dispatcher(), path="/webhook", secret="bench"))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 8093).start()
+        await bot.set_webhook("http://127.0.0.1:8093/webhook", secret_token="bench")
+        await fake.push_message("warmup")
+        await fake.wait_reply("re: warmup")
+        await measure_replies("webhook", fake, "hook")
+        await runner.cleanup()
+        await fake.stop()
+    
+    asyncio.run(polling())
+    asyncio.run(webhook())
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "backends": bench_backends,
+    "models": bench_models,
+    "database": bench_database,
+    "render": bench_render,
+    "lookup": bench_lookup,
+    "webhook": bench_webhook,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"=== {name} ===")
+        BENCHMARKS[name]()
+        print()
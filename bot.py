@@ -1,13 +1,18 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 import os
 
+from config import BOT_MODE, STATE_BACKEND
 from handlers import router
-from database import Database
+from database import db
 from scheduler import setup_scheduler
+from fetcher import schedule_fetcher
+from groups import group_registry
+from schedule_cache import schedule_cache
+from state import BackendStorage, LeaderLock, state_backend
+from webhook import UpdateWorkers, run_webhook
 
 
 # Load environment variables
@@ -19,9 +24,6 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN not found in environment variables. Please set it in .env file.")
 
-# Initialize database
-db = Database()
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,32 +32,66 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    """
+    Load shared state and start the scheduler, in either mode.
+    """
+    # Groups come from the registry, new ones are picked up from loaded pages
+    await group_registry.load()
+    schedule_cache.add_load_listener(group_registry.observe)
+    logger.info(f"📚 {len(group_registry.groups)} groups, registry version {group_registry.version}")
+    
+    # Setup and start scheduler, its jobs run in the process holding the lock
+    leader = LeaderLock(state_backend)
+    await leader.renew()
+    scheduler = setup_scheduler(bot, db, leader)
+    scheduler.start()
+    dispatcher["scheduler"] = scheduler
+    dispatcher["leader"] = leader
+    role = "leader" if leader.is_leader else "standby"
+    logger.info(f"📅 Scheduler started as {role} - daily notifications enabled at 18:00")
+    
+    logger.info(f"🚀 Bot started successfully in {BOT_MODE} mode, {STATE_BACKEND} state!")
+
+
+async def on_shutdown(dispatcher: Dispatcher, workers: UpdateWorkers):
+    """
+    Finish the updates in flight, then stop the scheduler and close resources.
+    
+    Runs before the bot session is closed.
+    """
+    await workers.drain()
+    dispatcher["scheduler"].shutdown()
+    # Hand the jobs over to another process right away
+    await dispatcher["leader"].release()
+    await state_backend.close()
+    await schedule_fetcher.close()
+    await db.close()
+
+
 async def main():
     """
     Main function to run the bot.
     """
     # Initialize bot and dispatcher
     bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    # FSM state is shared, any process can continue a user's dialog
+    storage = BackendStorage(state_backend)
+    workers = UpdateWorkers()
+    dp = Dispatcher(storage=storage, workers=workers)
     
-    # Register router
+    # Register router, updates beyond the worker count wait for a free worker
+    dp.update.outer_middleware(workers)
     dp.include_router(router)
     
-    # Setup and start scheduler
-    scheduler = setup_scheduler(bot, db)
-    scheduler.start()
-    logger.info("📅 Scheduler started - daily notifications enabled at 18:00")
-    
-    logger.info("🚀 Bot started successfully!")
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     
-    try:
-        # Start polling
+    if BOT_MODE == "webhook":
+        await run_webhook(bot, dp, workers)
+    else:
+        # Start polling, closes the bot session on exit
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
-    finally:
-        # Shutdown scheduler on exit
-        scheduler.shutdown()
-        await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+"""
+Rate-limited message fan-out for notifications.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import AsyncIterable, Dict, Iterable, Optional, Tuple, Union
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from config import BROADCAST_CONCURRENCY, BROADCAST_RATE
+
+
+# (chat_id, text, tag)
+Message = Tuple[int, str, str]
+
+
+class RateLimiter:
+    """Spaces calls evenly to at most `rate` per second."""
+    
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_at = 0.0
+    
+    async def wait(self):
+        """Wait for the next free slot."""
+        now = time.monotonic()
+        slot = max(now, self._next_at)
+        self._next_at = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    def pause(self, seconds: float):
+        """Hold every caller for the given time."""
+        self._next_at = max(self._next_at, time.monotonic() + seconds)
+
+
+# Shared by every Broadcaster: Telegram's limits are per bot, not per send
+send_limiter = RateLimiter(BROADCAST_RATE)
+# Next free send time per chat, shared the same way
+chat_slots: Dict[int, float] = {}
+
+
+class Broadcaster:
+    """
+    Sends messages through a bounded pool of workers.
+    
+    Sending follows Telegram's limits: a global messages-per-second rate and
+    at most one message per second to the same chat. Both limits are
+    shared by all broadcasts, so the daily fan-out, change pushes and
+    reminders running at once stay within them together. A RetryAfter
+    answer pauses all senders for the requested time and the message is
+    retried.
+    """
+    
+    PER_CHAT_INTERVAL = 1.0
+    MAX_RETRIES = 3
+    
+    def __init__(
+        self,
+        bot,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        limiter: RateLimiter = send_limiter
+    ):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self._chat_next_at = chat_slots
+    
+    async def send(
+        self,
+        messages: Union[Iterable[Message], AsyncIterable[Message]],
+        parse_mode: Optional[str] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Send messages and wait until all of them are delivered or failed.
+        
+        Args:
+            messages: (chat_id, text, tag) tuples, plain or async iterable;
+                tag groups the report, e.g. by student group
+            parse_mode: Telegram parse mode for all messages
+        
+        Returns:
+            Dict mapping tag to counters: sent, blocked, errors and the
+            seconds from start until the tag's last message was handled
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        report: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"sent": 0, "blocked": 0, "errors": 0, "seconds": 0.0}
+        )
+        started = time.monotonic()
+        
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    queue.task_done()
+                    return
+                chat_id, text, tag = item
+                result = await self._deliver(chat_id, text, parse_mode)
+                stats = report[tag]
+                stats[result] += 1
+                stats["seconds"] = time.monotonic() - started
+                queue.task_done()
+        
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            if isinstance(messages, AsyncIterable):
+                async for item in messages:
+                    await queue.put(item)
+            else:
+                for item in messages:
+                    await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            self._forget_idle_chats()
+        
+        return dict(report)
+    
+    async def _deliver(self, chat_id: int, text: str, parse_mode: Optional[str]) -> str:
+        for _ in range(self.MAX_RETRIES + 1):
+            await self._wait_for_chat(chat_id)
+            await self.limiter.wait()
+            try:
+                await self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+                return "sent"
+            except TelegramRetryAfter as e:
+                print(f"Flood control, pausing sending for {e.retry_after}s")
+                self.limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                # User blocked the bot or deleted the account
+                return "blocked"
+            except Exception as e:
+                print(f"Error sending to user {chat_id}: {e}")
+                return "errors"
+        
+        print(f"Giving up on user {chat_id} after {self.MAX_RETRIES} retries")
+        return "errors"
+    
+    def _forget_idle_chats(self):
+        # In place, other broadcasts may be using the same slots
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, next_at in self._chat_next_at.items() if next_at <= now]:
+            del self._chat_next_at[chat_id]
+    
+    async def _wait_for_chat(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._chat_next_at.get(chat_id, 0.0))
+        self._chat_next_at[chat_id] = slot + self.PER_CHAT_INTERVAL
+        if slot > now:
+            await asyncio.sleep(slot - now)
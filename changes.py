@@ -0,0 +1,113 @@
+"""
+Detection of schedule changes between two versions of a day.
+"""
+
+from typing import Dict, List, Optional
+
+from models import DaySchedule, GroupDay, Lesson
+from renderer import escape
+
+
+def describe_lesson(lesson: Lesson, parse_mode: Optional[str] = None) -> str:
+    subject = escape(lesson.subject, parse_mode)
+    if lesson.room:
+        return f"{subject} ({escape(lesson.room.strip(), parse_mode)})"
+    return subject
+
+
+def pair_name(lesson: Lesson) -> str:
+    """ "III пара", with the subgroup for split pairs."""
+    if lesson.subgroup:
+        return f"{lesson.numeral} пара ({lesson.subgroup} п/гр)"
+    return f"{lesson.numeral} пара"
+
+
+def diff_group_day(
+    old: Optional[GroupDay],
+    new: Optional[GroupDay],
+    subgroup: int = 0,
+    parse_mode: Optional[str] = None
+) -> List[str]:
+    """
+    Describe what changed in a group's lessons, one line per change.
+    
+    Args:
+        old: Previous lessons of the group
+        new: Current lessons of the group
+        subgroup: Only changes of lessons this subgroup attends, 0 for all
+        parse_mode: Telegram parse mode the site text is escaped for
+    
+    Returns:
+        Lines like "III пара: аудитория №26 → №14", in pair order
+    """
+    # Split pairs are compared subgroup by subgroup
+    old_lessons = {
+        (lesson.number, lesson.subgroup): lesson for lesson in (old or ()) if lesson.applies_to(subgroup)
+    }
+    new_lessons = {
+        (lesson.number, lesson.subgroup): lesson for lesson in (new or ()) if lesson.applies_to(subgroup)
+    }
+    
+    lines = []
+    for key in sorted(old_lessons.keys() | new_lessons.keys()):
+        before = old_lessons.get(key)
+        after = new_lessons.get(key)
+        if before == after:
+            continue
+        
+        was_held = before is not None and not before.is_empty
+        is_held = after is not None and not after.is_empty
+        if not was_held and not is_held:
+            # e.g. an empty pair that is now split into empty subgroups
+            continue
+        
+        pair = pair_name(after or before)
+        if not was_held:
+            lines.append(f"{pair}: добавлена {describe_lesson(after, parse_mode)}")
+        elif not is_held:
+            lines.append(f"{pair}: отменена {describe_lesson(before, parse_mode)}")
+        elif before.subject != after.subject:
+            lines.append(f"{pair}: {describe_lesson(before, parse_mode)} → {describe_lesson(after, parse_mode)}")
+        else:
+            if before.room != after.room:
+                lines.append(
+                    f"{pair}: аудитория {escape(before.room.strip(), parse_mode)} → "
+                    f"{escape(after.room.strip(), parse_mode)}"
+                )
+            if before.teacher != after.teacher:
+                lines.append(
+                    f"{pair}: преподаватель {escape(before.teacher, parse_mode)} → "
+                    f"{escape(after.teacher, parse_mode)}"
+                )
+    
+    return lines
+
+
+def detect_changes(old: DaySchedule, new: DaySchedule, parse_mode: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Find groups whose lessons differ between two versions of a day.
+    
+    Groups are compared by content hash first, so only changed groups
+    are diffed lesson by lesson.
+    
+    Args:
+        old: Previous version of the day
+        new: Current version of the day
+        parse_mode: Telegram parse mode the site text is escaped for
+    
+    Returns:
+        Dict mapping changed group name to its change lines
+    """
+    changes = {}
+    for group in old.groups.keys() | new.groups.keys():
+        old_group = old.get(group)
+        new_group = new.get(group)
+        old_hash = old_group.content_hash() if old_group is not None else None
+        new_hash = new_group.content_hash() if new_group is not None else None
+        if old_hash == new_hash:
+            continue
+        
+        lines = diff_group_day(old_group, new_group, parse_mode=parse_mode)
+        if lines:
+            changes[group] = lines
+    return changes
@@ -22,5 +22,74 @@ GROUPS = [
     "М-23", "ЭП-23", "ПГ-23", "СЭН-23", "ПН-23"
 ]
 
+# SQLite database file with user settings, snapshots and shared state
+DATABASE_PATH = os.getenv("DATABASE_PATH", "bot_data.db")
+
 # Groups per page for pagination
 GROUPS_PER_PAGE = 10
+
+# Inline mode: seconds Telegram may reuse the results of a query, and the
+# most groups offered per query (two results each, today and tomorrow)
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+INLINE_MAX_GROUPS = 10
+
+# Site sessions kept by the fetcher, each one bound to a date; with one per
+# day of the week a week view loads all of its days in parallel
+FETCH_SESSIONS = int(os.getenv("FETCH_SESSIONS", "7"))
+
+# Seconds a fetched day schedule is served from cache before it is refreshed
+SCHEDULE_CACHE_TTL = int(os.getenv("SCHEDULE_CACHE_TTL", "600"))
+
+# Notification broadcast: parallel senders and global messages per second
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+
+# HTML parser backend for the day page: "lxml" (fast) or "bs4" (BeautifulSoup)
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+
+# Background warm-up of the schedule cache: number of school days ahead
+# (starting today), daily run times as HH:MM, and random delay in seconds
+PREFETCH_DAYS = int(os.getenv("PREFETCH_DAYS", "6"))
+PREFETCH_TIMES = os.getenv("PREFETCH_TIMES", "06:30,12:00,17:45").split(",")
+PREFETCH_JITTER = int(os.getenv("PREFETCH_JITTER", "120"))
+
+# Minutes between checks of today's and tomorrow's page for changes
+CHANGE_POLL_MINUTES = int(os.getenv("CHANGE_POLL_MINUTES", "15"))
+
+# Number of user profiles kept in memory
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+# Seconds a cached profile is served before it is read again, so changes
+# made through another bot process show up
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "30"))
+
+# How updates are received: "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Webhook mode: public base URL Telegram posts to (https://example.com), path,
+# secret token checked on every request (required, webhook mode does not start
+# without it), and the local address to listen on
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Updates handled at the same time, in both modes
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))
+
+# State shared by the bot processes (FSM, schedule snapshots, scheduler
+# leader lock): "sqlite" for processes on one host sharing bot_data.db, or
+# "redis" (needs the redis package) for processes on several hosts
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Seconds the scheduler leader lock is held without renewal; only the
+# process holding it sends notifications
+LEADER_LOCK_TTL = int(os.getenv("LEADER_LOCK_TTL", "30"))
+
+# Start of each pair (I, II, III, ...) per shift as HH:MM, in college time
+BELLS_SHIFT_1 = os.getenv("BELLS_SHIFT_1", "08:30,10:10,11:50,13:30,15:10,16:50").split(",")
+BELLS_SHIFT_2 = os.getenv("BELLS_SHIFT_2", "13:30,15:10,16:50,18:30,20:10,21:50").split(",")
+
+# Minutes before a pair starts that its reminder is sent
+REMINDER_MINUTES = int(os.getenv("REMINDER_MINUTES", "10"))
@@ -0,0 +1,10 @@
+"""
+Shared pytest setup: the tests use a temporary database, the tracked
+bot_data.db is never opened.
+"""
+
+import os
+import tempfile
+
+
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "test_bot_data.db")
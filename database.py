@@ -1,44 +1,272 @@
 """
-Database module for storing user settings.
+Database module for storing user settings and schedule snapshots.
 """
 
+import asyncio
+import queue
 import sqlite3
-from typing import Optional
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from config import DATABASE_PATH
+from models import DaySchedule, GroupDay, Lesson, UserProfile, intern_text
+
+
+# Version of the tables below, kept in PRAGMA user_version; init_db only
+# migrates databases with an older version
+SCHEMA_VERSION = 1
+
+# Seconds a write waits for another process holding the database lock
+BUSY_TIMEOUT = 10.0
+
+
+def read_only(method):
+    """Mark a Database method that never writes, see Database.batch."""
+    method.read_only = True
+    return method
 
 
 class Database:
-    def __init__(self, db_path: str = "bot_data.db"):
+    """
+    SQLite storage on one persistent connection in WAL mode.
+    
+    Methods are synchronous and thread-safe. Each call commits on its own
+    unless it runs inside batch(), which commits all calls at once.
+    """
+    
+    def __init__(self, db_path: str = DATABASE_PATH, busy_timeout: float = BUSY_TIMEOUT):
         self.db_path = db_path
+        # Statements are prepared once per connection and reused from its cache
+        self._conn = sqlite3.connect(
+            db_path, timeout=busy_timeout, check_same_thread=False, cached_statements=256
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._in_batch = False
         self.init_db()
     
+    @contextmanager
+    def _connection(self):
+        """Connection for one call, committed or rolled back when it ends."""
+        with self._lock:
+            if self._in_batch:
+                # Only undo this call on error, the batch commits the rest
+                self._conn.execute("SAVEPOINT call")
+                try:
+                    yield self._conn
+                except BaseException:
+                    self._conn.execute("ROLLBACK TO call")
+                    raise
+                finally:
+                    self._conn.execute("RELEASE call")
+                return
+            
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.rollback()
+                raise
+            else:
+                self._conn.commit()
+    
+    @contextmanager
+    def batch(self, write: bool = True):
+        """
+        Run several calls in one transaction with a single commit.
+        
+        A batch that writes takes the write lock when it starts, waiting up
+        to BUSY_TIMEOUT for other processes. A deferred transaction that
+        read first could not take it later once another process had
+        committed in between, SQLite fails such a batch at once without
+        waiting. A batch of read_only calls takes no lock, so reads in
+        every process go on while one of them writes.
+        
+        Args:
+            write: Whether any call in the batch may write
+        """
+        with self._lock:
+            if self._in_batch:
+                yield
+                return
+            
+            self._conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            self._in_batch = True
+            try:
+                yield
+            except BaseException:
+                self._conn.rollback()
+                raise
+            else:
+                self._conn.commit()
+            finally:
+                self._in_batch = False
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
     def init_db(self):
-        """Initialize database and create tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Create the tables or migrate them to SCHEMA_VERSION.
+        
+        Nothing is written when the schema is already current.
+        """
+        with self._connection() as conn:
             cursor = conn.cursor()
+            if cursor.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+            
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     user_id INTEGER PRIMARY KEY,
                     default_group TEXT,
                     notifications_enabled INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    subgroup INTEGER NOT NULL DEFAULT 0,
+                    reminders_enabled INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            
+            # Databases created before subgroups and reminders were stored
+            # lack the columns
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(users)")}
+            if "subgroup" not in columns:
+                cursor.execute("ALTER TABLE users ADD COLUMN subgroup INTEGER NOT NULL DEFAULT 0")
+            if "reminders_enabled" not in columns:
+                cursor.execute("ALTER TABLE users ADD COLUMN reminders_enabled INTEGER NOT NULL DEFAULT 0")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schedule_days (
+                    date TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    shift INTEGER NOT NULL DEFAULT 1,
+                    parser_version INTEGER NOT NULL DEFAULT 1
                 )
             """)
-            conn.commit()
+            # Snapshots saved before the version was stored come from version 1
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(schedule_days)")}
+            if "shift" not in columns:
+                cursor.execute("ALTER TABLE schedule_days ADD COLUMN shift INTEGER NOT NULL DEFAULT 1")
+            if "parser_version" not in columns:
+                cursor.execute("ALTER TABLE schedule_days ADD COLUMN parser_version INTEGER NOT NULL DEFAULT 1")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schedule_lessons (
+                    date TEXT NOT NULL,
+                    group_name TEXT NOT NULL,
+                    pair INTEGER NOT NULL,
+                    subgroup INTEGER NOT NULL DEFAULT 0,
+                    subject TEXT NOT NULL,
+                    room TEXT NOT NULL,
+                    teacher TEXT NOT NULL,
+                    PRIMARY KEY (date, group_name, pair, subgroup)
+                ) WITHOUT ROWID
+            """)
+            
+            # Groups found on the site, in the order of the page
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS group_registry (
+                    name TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    version INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            
+            # Keys shared by the bot processes (FSM state, leader lock)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS shared_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                ) WITHOUT ROWID
+            """)
+            
+            # Subscribers of a group with their subgroup, read in user_id
+            # order straight from the index
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_group_subgroup_subscribers
+                ON users (default_group, user_id, subgroup)
+                WHERE notifications_enabled = 1
+            """)
+            
+            # Users with pair reminders, by group
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_group_reminders
+                ON users (default_group, user_id, subgroup)
+                WHERE reminders_enabled = 1
+            """)
+            
+            # Subscriber count per group, kept up to date by triggers on users
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS group_subscribers (
+                    group_name TEXT PRIMARY KEY,
+                    subscribers INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_subscribe_insert
+                AFTER INSERT ON users
+                WHEN NEW.notifications_enabled = 1 AND NEW.default_group IS NOT NULL
+                BEGIN
+                    INSERT INTO group_subscribers (group_name, subscribers)
+                    VALUES (NEW.default_group, 1)
+                    ON CONFLICT(group_name) DO UPDATE SET subscribers = subscribers + 1;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_subscribe_delete
+                AFTER DELETE ON users
+                WHEN OLD.notifications_enabled = 1 AND OLD.default_group IS NOT NULL
+                BEGIN
+                    UPDATE group_subscribers SET subscribers = subscribers - 1
+                    WHERE group_name = OLD.default_group;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_subscribe_update
+                AFTER UPDATE OF default_group, notifications_enabled ON users
+                BEGIN
+                    UPDATE group_subscribers SET subscribers = subscribers - 1
+                    WHERE group_name = OLD.default_group
+                        AND OLD.notifications_enabled = 1;
+                    INSERT INTO group_subscribers (group_name, subscribers)
+                    SELECT NEW.default_group, 1
+                    WHERE NEW.notifications_enabled = 1 AND NEW.default_group IS NOT NULL
+                    ON CONFLICT(group_name) DO UPDATE SET subscribers = subscribers + 1;
+                END
+            """)
+            
+            # Count the users added before the triggers existed
+            cursor.execute("DELETE FROM group_subscribers")
+            cursor.execute("""
+                INSERT INTO group_subscribers (group_name, subscribers)
+                SELECT default_group, COUNT(*)
+                FROM users
+                WHERE notifications_enabled = 1 AND default_group IS NOT NULL
+                GROUP BY default_group
+            """)
+            
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     
     def set_default_group(self, user_id: int, group: str):
         """Set default group for a user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO users (user_id, default_group)
                 VALUES (?, ?)
                 ON CONFLICT(user_id) DO UPDATE SET default_group = ?
             """, (user_id, group, group))
-            conn.commit()
     
+    @read_only
     def get_default_group(self, user_id: int) -> Optional[str]:
         """Get user's default group."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT default_group FROM users WHERE user_id = ?", (user_id,))
             result = cursor.fetchone()
@@ -46,26 +274,64 @@ class Database:
     
     def set_notifications(self, user_id: int, enabled: bool):
         """Enable or disable notifications for a user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO users (user_id, notifications_enabled)
                 VALUES (?, ?)
                 ON CONFLICT(user_id) DO UPDATE SET notifications_enabled = ?
             """, (user_id, int(enabled), int(enabled)))
-            conn.commit()
     
+    def set_subgroup(self, user_id: int, subgroup: int):
+        """Set the subgroup of a user within the default group, 0 for none."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO users (user_id, subgroup)
+                VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET subgroup = ?
+            """, (user_id, subgroup, subgroup))
+    
+    def set_reminders(self, user_id: int, enabled: bool):
+        """Enable or disable reminders before each pair for a user."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO users (user_id, reminders_enabled)
+                VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET reminders_enabled = ?
+            """, (user_id, int(enabled), int(enabled)))
+    
+    @read_only
     def get_notifications_enabled(self, user_id: int) -> bool:
         """Check if notifications are enabled for a user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT notifications_enabled FROM users WHERE user_id = ?", (user_id,))
             result = cursor.fetchone()
             return bool(result[0]) if result else True  # Default: enabled
     
+    @read_only
+    def get_user_profile(self, user_id: int) -> UserProfile:
+        """Get all settings of a user in one query, defaults if the user is unknown."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT default_group, notifications_enabled, subgroup, reminders_enabled
+                FROM users WHERE user_id = ?
+            """, (user_id,))
+            result = cursor.fetchone()
+        
+        if result is None:
+            return UserProfile(user_id)
+        return UserProfile(
+            user_id, result[0], bool(result[1]) if result[1] is not None else True, result[2], bool(result[3])
+        )
+    
+    @read_only
     def get_all_users_with_notifications(self) -> list:
         """Get all users who have notifications enabled and a default group set."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT user_id, default_group 
@@ -73,3 +339,365 @@ class Database:
                 WHERE notifications_enabled = 1 AND default_group IS NOT NULL
             """)
             return cursor.fetchall()
+    
+    @read_only
+    def get_group_subscribers(self, group: str, after_user_id: int = 0, limit: int = 500) -> list:
+        """
+        Get a chunk of users with notifications enabled for a group.
+        
+        Args:
+            group: Group name
+            after_user_id: Return only ids greater than this, i.e. the last
+                id of the previous chunk
+            limit: Maximum number of users
+        
+        Returns:
+            (user_id, subgroup) tuples in ascending user_id order
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_id, subgroup
+                FROM users
+                WHERE default_group = ? AND notifications_enabled = 1 AND user_id > ?
+                ORDER BY user_id
+                LIMIT ?
+            """, (group, after_user_id, limit))
+            return cursor.fetchall()
+    
+    @read_only
+    def get_reminder_subscribers(self, group: str, after_user_id: int = 0, limit: int = 500) -> list:
+        """
+        Get a chunk of users with reminders enabled for a group.
+        
+        Same arguments and result as get_group_subscribers.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_id, subgroup
+                FROM users
+                WHERE default_group = ? AND reminders_enabled = 1 AND user_id > ?
+                ORDER BY user_id
+                LIMIT ?
+            """, (group, after_user_id, limit))
+            return cursor.fetchall()
+    
+    @read_only
+    def get_subscriber_counts(self) -> Dict[str, int]:
+        """Get the number of users with notifications enabled per group."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT group_name, subscribers FROM group_subscribers WHERE subscribers > 0")
+            return dict(cursor.fetchall())
+    
+    @read_only
+    def get_group_registry(self) -> Tuple[List[str], int]:
+        """
+        Get the stored group registry.
+        
+        Returns:
+            Group names by position and the registry version, 0 if no
+            registry is stored yet
+        """
+        with self._connection() as conn:
+            return self._read_group_registry(conn.cursor())
+    
+    def add_groups(self, groups: Sequence[str]) -> Tuple[List[str], int]:
+        """
+        Append groups missing from the stored registry.
+        
+        Each new group takes the next free position and the next version
+        in the same statement, so processes adding groups at once never
+        give one position to two groups or drop each other's groups.
+        
+        Args:
+            groups: Group names in page order, known ones are skipped
+        
+        Returns:
+            The registry after the insert, as get_group_registry
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            for group in groups:
+                cursor.execute("""
+                    INSERT INTO group_registry (name, position, version)
+                    SELECT ?, COALESCE(MAX(position) + 1, 0), COALESCE(MAX(version), 0) + 1
+                    FROM group_registry WHERE true
+                    ON CONFLICT(name) DO NOTHING
+                """, (group,))
+            return self._read_group_registry(cursor)
+    
+    @staticmethod
+    def _read_group_registry(cursor: sqlite3.Cursor) -> Tuple[List[str], int]:
+        cursor.execute("SELECT name, version FROM group_registry ORDER BY position")
+        rows = cursor.fetchall()
+        return [row[0] for row in rows], max((row[1] for row in rows), default=0)
+    
+    @read_only
+    def get_known_rooms(self) -> List[str]:
+        """Get every room that appears in a stored schedule snapshot."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT room FROM schedule_lessons WHERE room != ''")
+            return [row[0] for row in cursor.fetchall()]
+    
+    def save_schedule_day(self, day_schedule: DaySchedule, fetched_at: Optional[float] = None) -> bool:
+        """
+        Store a parsed day, replacing the previous snapshot of that date.
+        
+        Args:
+            day_schedule: Day to store
+            fetched_at: Unix time the day was loaded from the site, now if None
+        
+        Returns:
+            True if the content differs from the stored snapshot
+        """
+        day = day_schedule.date.isoformat()
+        content_hash = day_schedule.content_hash()
+        if fetched_at is None:
+            fetched_at = time.time()
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content_hash, parser_version FROM schedule_days WHERE date = ?", (day,))
+            result = cursor.fetchone()
+            changed = result is None or result != (content_hash, day_schedule.parser_version)
+            
+            if changed:
+                cursor.execute("DELETE FROM schedule_lessons WHERE date = ?", (day,))
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO schedule_lessons
+                        (date, group_name, pair, subgroup, subject, room, teacher)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (day, group, lesson.number, lesson.subgroup, lesson.subject, lesson.room, lesson.teacher)
+                    for group, group_day in day_schedule.groups.items()
+                    for lesson in group_day
+                ])
+            
+            cursor.execute("""
+                INSERT INTO schedule_days (date, content_hash, fetched_at, shift, parser_version)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(date) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    fetched_at = excluded.fetched_at,
+                    shift = excluded.shift,
+                    parser_version = excluded.parser_version
+            """, (day, content_hash, fetched_at, day_schedule.shift, day_schedule.parser_version))
+            return changed
+    
+    @read_only
+    def get_schedule_day(self, day: date) -> Optional[Tuple[DaySchedule, float]]:
+        """
+        Load the stored snapshot of a date.
+        
+        Returns:
+            The day and the Unix time it was fetched, or None if not stored
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT d.fetched_at, d.shift, d.parser_version,
+                    l.group_name, l.pair, l.subject, l.room, l.teacher, l.subgroup
+                FROM schedule_days d
+                LEFT JOIN schedule_lessons l ON l.date = d.date
+                WHERE d.date = ?
+                ORDER BY l.group_name, l.pair, l.subgroup
+            """, (day.isoformat(),))
+            rows = cursor.fetchall()
+        
+        if not rows:
+            return None
+        
+        lessons = defaultdict(list)
+        for _, _, _, group, pair, subject, room, teacher, subgroup in rows:
+            if group is not None:
+                lessons[group].append(Lesson.stored(pair, subject, room, teacher, subgroup))
+        
+        groups = {group: GroupDay(intern_text(group), tuple(items)) for group, items in lessons.items()}
+        return DaySchedule(day, groups, rows[0][1], rows[0][2]), rows[0][0]
+    
+    @read_only
+    def get_shared_value(self, key: str) -> Optional[str]:
+        """Get a shared value, None if missing or expired."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT value FROM shared_state
+                WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+            """, (key, time.time()))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def set_shared_value(self, key: str, value: str, expires_at: Optional[float] = None):
+        """Set a shared value, kept until expires_at (Unix time) or forever if None."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO shared_state (key, value, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+            """, (key, value, expires_at))
+    
+    def delete_shared_value(self, key: str, value: Optional[str] = None):
+        """Delete a shared value, only if it still equals value when given."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if value is None:
+                cursor.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+            else:
+                cursor.execute("DELETE FROM shared_state WHERE key = ? AND value = ?", (key, value))
+    
+    def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Take a lock or extend it if owner already holds it.
+        
+        The check and the write are one statement, so of several processes
+        racing for a free or expired lock exactly one gets it.
+        
+        Args:
+            name: Lock key
+            owner: Id of the process asking
+            ttl: Seconds until the lock expires unless extended again
+        
+        Returns:
+            True if owner holds the lock now
+        """
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO shared_state (key, value, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+                WHERE shared_state.value = excluded.value OR shared_state.expires_at <= ?
+            """, (name, owner, now + ttl, now))
+            return cursor.rowcount == 1
+
+
+class AsyncDatabase:
+    """
+    Runs Database methods on a dedicated thread, off the event loop.
+    
+    Every Database method is available as a coroutine with the same name.
+    Calls that queue up while the thread is busy run together in one
+    transaction (group commit); each caller gets its result after that
+    commit. A batch made only of read_only calls takes no write lock.
+    """
+    
+    MAX_BATCH = 64
+    
+    def __init__(self, database: Database):
+        self.database = database
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+    
+    def __getattr__(self, name):
+        method = getattr(self.database, name)
+        if not callable(method):
+            return method
+        
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+    
+    async def run(self, function, *args, **kwargs):
+        """Run a function on the database thread and wait for its committed result."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="database", daemon=True)
+            self._thread.start()
+        
+        future = Future()
+        self._queue.put((future, function, args, kwargs))
+        return await asyncio.wrap_future(future)
+    
+    async def iter_group_subscribers(
+        self,
+        group: str,
+        chunk_size: int = 500,
+        reminders: bool = False
+    ) -> AsyncIterator[List[Tuple[int, int]]]:
+        """
+        Stream (user_id, subgroup) of a group's subscribers in chunks.
+        
+        Each chunk is one indexed range query, so only the group's own rows
+        are read and no more than one chunk is held in memory.
+        
+        Args:
+            group: Group name
+            chunk_size: Users per query
+            reminders: Stream users with pair reminders instead of the
+                daily notification
+        """
+        fetch = self.get_reminder_subscribers if reminders else self.get_group_subscribers
+        after_user_id = 0
+        while True:
+            chunk = await fetch(group, after_user_id, chunk_size)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after_user_id = chunk[-1][0]
+    
+    async def close(self):
+        """Finish queued calls, stop the thread and close the connection."""
+        if self._thread is not None:
+            self._queue.put(None)
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        self.database.close()
+    
+    def _worker(self):
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.MAX_BATCH:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # Calls not marked read_only, e.g. functions given to run(),
+            # are taken to write
+            write = any(
+                job is not None and not getattr(job[1], "read_only", False) for job in jobs
+            )
+            
+            results = []
+            try:
+                with self.database.batch(write):
+                    for job in jobs:
+                        if job is None:
+                            continue
+                        future, function, args, kwargs = job
+                        # Skip calls whose caller has gone away
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        try:
+                            results.append((future, function(*args, **kwargs), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+            except Exception as e:
+                # The batch could not start (the write lock stayed busy) or
+                # commit: none of the calls took effect, every waiting
+                # caller gets the error
+                results = [
+                    (job[0], None, e) for job in jobs
+                    if job is not None and not job[0].cancelled()
+                ]
+            
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            
+            if None in jobs:
+                return
+
+
+# Shared database used by the bot
+db = AsyncDatabase(Database())
@@ -0,0 +1,126 @@
+"""
+Local stand-in for a Redis server, for testing the Redis state backend
+without one.
+
+Speaks RESP2 and knows the commands the backend sends: GET, SET with
+NX/XX/EX/PX, DEL, PING and EVAL of the two lock scripts from state.py.
+
+Usage:
+    server = FakeRedis()
+    await server.start()
+    backend = RedisBackend(server.url)
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from state import ACQUIRE_LOCK_SCRIPT, RELEASE_LOCK_SCRIPT
+
+
+class FakeRedis:
+    """In-memory key-value server answering the Redis protocol."""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 6390):
+        self.host = host
+        self.port = port
+        # key -> (value, monotonic expiry time or None)
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+    
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+    
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+    
+    def _execute(self, args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"GET":
+            return self._bulk(self._get(args[1]))
+        if name == b"SET":
+            return self._set(args[1], args[2], [arg.upper() for arg in args[3:]])
+        if name == b"DEL":
+            deleted = sum(self._data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % deleted
+        if name == b"EVAL":
+            return self._eval(args[1].decode(), args[3:3 + int(args[2])], args[3 + int(args[2]):])
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+    
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and time.monotonic() >= expires:
+            del self._data[key]
+            return None
+        return value
+    
+    def _set(self, key: bytes, value: bytes, options: List[bytes]) -> bytes:
+        exists = self._get(key) is not None
+        if b"NX" in options and exists or b"XX" in options and not exists:
+            return self._bulk(None)
+        
+        expires = None
+        if b"PX" in options:
+            expires = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            expires = time.monotonic() + int(options[options.index(b"EX") + 1])
+        self._data[key] = (value, expires)
+        return b"+OK\r\n"
+    
+    def _eval(self, script: str, keys: List[bytes], argv: List[bytes]) -> bytes:
+        # Scripts run without other commands in between, as in Redis
+        if script == ACQUIRE_LOCK_SCRIPT:
+            current = self._get(keys[0])
+            if current is None or current == argv[0]:
+                self._set(keys[0], argv[0], [b"PX", argv[1]])
+                return b":1\r\n"
+            return b":0\r\n"
+        if script == RELEASE_LOCK_SCRIPT:
+            if self._get(keys[0]) == argv[0]:
+                del self._data[keys[0]]
+                return b":1\r\n"
+            return b":0\r\n"
+        return b"-ERR script not supported by the stand-in\r\n"
+    
+    @staticmethod
+    def _bulk(value: Optional[bytes]) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Telegram Bot API, for testing and benchmarking
+the bot's runtime modes without network access.
+
+Usage:
+    fake = FakeTelegram()
+    await fake.start()
+    bot = fake.bot()
+    fake.push_message("hello")    # delivered by getUpdates or to the webhook
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+
+TOKEN = "123456:TEST"
+CHAT_ID = 1000
+
+
+class FakeTelegram:
+    """
+    Bot API server answering the methods the bot uses.
+    
+    Updates are queued for getUpdates until setWebhook is called, after
+    that they are posted to the webhook with the secret token header.
+    Every sendMessage is recorded with the time it arrived.
+    """
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.host = host
+        self.port = port
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        # (arrival time, chat id, text) of every sendMessage
+        self.sent: List[tuple] = []
+        # (method, parameters) of every other request
+        self.calls: List[tuple] = []
+        self._updates: asyncio.Queue = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._replies: Dict[str, asyncio.Future] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+    
+    def bot(self, token: str = TOKEN) -> Bot:
+        """Bot whose requests go to this server."""
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.url))
+        return Bot(token=token, session=session)
+    
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._session = aiohttp.ClientSession()
+    
+    async def stop(self):
+        if self._session:
+            await self._session.close()
+        if self._runner:
+            await self._runner.cleanup()
+    
+    def inline_query_update(self, query: str, user_id: int = CHAT_ID) -> Dict[str, Any]:
+        """Update with an inline query."""
+        return {
+            "update_id": next(self._update_ids),
+            "inline_query": {
+                "id": str(next(self._message_ids)),
+                "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+                "query": query,
+                "offset": ""
+            }
+        }
+    
+    def message_update(self, text: str, chat_id: int = CHAT_ID) -> Dict[str, Any]:
+        """Update with a private text message."""
+        user = {"id": chat_id, "is_bot": False, "first_name": "Test"}
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": user,
+                "text": text
+            }
+        }
+    
+    async def push(self, update: Dict[str, Any]) -> int:
+        """
+        Deliver an update to the bot.
+        
+        Returns:
+            HTTP status of the webhook request, 200 for getUpdates
+        """
+        if self.webhook_url is None:
+            self._updates.put_nowait(update)
+            return 200
+        
+        headers = {}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+        async with self._session.post(self.webhook_url, json=update, headers=headers) as response:
+            return response.status
+    
+    async def push_message(self, text: str, chat_id: int = CHAT_ID) -> int:
+        return await self.push(self.message_update(text, chat_id))
+    
+    async def wait_reply(self, text: str, timeout: float = 5) -> float:
+        """Wait for a sendMessage with the given text, return its arrival time."""
+        for sent_at, _, sent_text in self.sent:
+            if sent_text == text:
+                return sent_at
+        future = self._replies.setdefault(text, asyncio.get_running_loop().create_future())
+        return await asyncio.wait_for(future, timeout)
+    
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        
+        if method == "getme":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "test_bot"}
+        elif method == "getupdates":
+            result = await self._get_updates(float(params.get("timeout") or 0))
+        elif method == "sendmessage":
+            result = self._send_message(params)
+        elif method == "setwebhook":
+            self.webhook_url = params["url"]
+            self.webhook_secret = params.get("secret_token")
+            result = True
+        elif method == "deletewebhook":
+            self.webhook_url = self.webhook_secret = None
+            result = True
+        else:
+            self.calls.append((method, params))
+            result = True
+        return web.json_response({"ok": True, "result": result})
+    
+    async def _get_updates(self, timeout: float) -> List[Dict[str, Any]]:
+        """Long poll: wait up to timeout for the first update, then take all queued."""
+        try:
+            first = await asyncio.wait_for(self._updates.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        updates = [first]
+        while not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+    
+    def _send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        sent_at = time.perf_counter()
+        chat_id = int(params["chat_id"])
+        text = params["text"]
+        self.sent.append((sent_at, chat_id, text))
+        future = self._replies.pop(text, None)
+        if future is not None and not future.done():
+            future.set_result(sent_at)
+        
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text
+        }
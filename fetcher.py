@@ -0,0 +1,223 @@
+"""
+Asynchronous HTTP client for lntrt.ru.
+"""
+
+import asyncio
+import time
+from datetime import date
+from typing import List, Optional, Tuple
+
+import aiohttp
+
+from config import FETCH_SESSIONS
+
+
+SAVE_URL = "http://lntrt.ru/save"
+DAY_SCHEDULE_URL = "http://lntrt.ru/schedule/daySchedule"  # Note: /schedule not /fulltime/schedule
+
+# Required header for AJAX requests
+AJAX_HEADERS = {"X-Requested-With": "XMLHttpRequest"}
+
+MONTHS_GENITIVE = [
+    "", "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря"
+]
+
+
+class _PooledSession:
+    """aiohttp session whose server-side state is bound to one date."""
+    
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.bound_date: Optional[date] = None
+        self.bound_at = 0.0
+        self.last_used = 0.0
+        self.users = 0
+        # Set once /save for bound_date has finished
+        self.ready = asyncio.Event()
+
+
+class ScheduleFetcher:
+    """
+    Pooled aiohttp client for the day schedule page.
+    
+    The site keeps the selected date in the server-side session: /save binds
+    the session cookie to a date and the day page then returns that date.
+    The fetcher keeps a small pool of sessions and remembers which date each
+    one is bound to. A fetch for a date some session is already bound to
+    skips /save, and a session is only rebound to another date when no
+    fetch is using it. All sessions share one keep-alive connection pool.
+    """
+    
+    def __init__(
+        self,
+        pool_size: int = 4,
+        limit: int = 10,
+        timeout: float = 10,
+        bind_ttl: float = 300
+    ):
+        self.pool_size = pool_size
+        self.limit = limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        # Rebind after this many seconds in case the server session expired
+        self.bind_ttl = bind_ttl
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._pool: List[_PooledSession] = []
+        self._released: Optional[asyncio.Condition] = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def fetch_day_html(self, day: date) -> Optional[bytes]:
+        """
+        Download the day page with the schedule of all groups.
+        
+        Args:
+            day: Date to fetch
+        
+        Returns:
+            Raw HTML of the day page or None if error
+        """
+        pooled, needs_bind = await self._acquire(day)
+        try:
+            if needs_bind:
+                bound = await self._bind(pooled, day)
+            else:
+                bound = await self._wait_bound(pooled, day)
+            if not bound:
+                return None
+            
+            content = await self._get_page(pooled)
+            if content is not None and not page_matches_date(content, day):
+                # The server forgot the date, bind it again and retry once
+                content = None
+                if await self._bind(pooled, day):
+                    content = await self._get_page(pooled)
+            return content
+        finally:
+            await self._release(pooled)
+    
+    async def close(self):
+        """Close all sessions and the connection pool."""
+        for pooled in self._pool:
+            await pooled.session.close()
+        self._pool.clear()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+    
+    async def _acquire(self, day: date) -> Tuple[_PooledSession, bool]:
+        if self._released is None:
+            self._released = asyncio.Condition()
+        
+        async with self._released:
+            while True:
+                now = time.monotonic()
+                for pooled in self._pool:
+                    if pooled.bound_date == day and now - pooled.bound_at < self.bind_ttl:
+                        pooled.users += 1
+                        return pooled, False
+                
+                pooled = self._take_idle_session()
+                if pooled is not None:
+                    # Claim the session for the new date before /save finishes,
+                    # so concurrent fetches of the same date join it
+                    pooled.users += 1
+                    pooled.bound_date = day
+                    pooled.bound_at = now
+                    pooled.ready.clear()
+                    return pooled, True
+                
+                await self._released.wait()
+    
+    def _take_idle_session(self) -> Optional[_PooledSession]:
+        idle = [pooled for pooled in self._pool if pooled.users == 0]
+        if idle:
+            return min(idle, key=lambda pooled: pooled.last_used)
+        
+        if len(self._pool) < self.pool_size:
+            pooled = _PooledSession(self._new_session())
+            self._pool.append(pooled)
+            return pooled
+        
+        return None
+    
+    async def _release(self, pooled: _PooledSession):
+        async with self._released:
+            pooled.users -= 1
+            pooled.last_used = time.monotonic()
+            self._released.notify_all()
+    
+    async def _wait_bound(self, pooled: _PooledSession, day: date) -> bool:
+        await pooled.ready.wait()
+        return pooled.bound_date == day
+    
+    async def _bind(self, pooled: _PooledSession, day: date) -> bool:
+        """Store the date in the server-side session with /save."""
+        date_str = day.strftime("%Y-%m-%d")  # YYYY-MM-DD format for API
+        save_params = {"dateSched": date_str, "academicYear": date_str}
+        
+        try:
+            async with pooled.session.get(SAVE_URL, params=save_params) as response:
+                response.raise_for_status()
+                await response.read()
+            pooled.bound_date = day
+            pooled.bound_at = time.monotonic()
+            return True
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching schedule: {e!r}")
+            pooled.bound_date = None
+            return False
+        
+        finally:
+            pooled.ready.set()
+    
+    async def _get_page(self, pooled: _PooledSession) -> Optional[bytes]:
+        try:
+            async with pooled.session.get(DAY_SCHEDULE_URL) as response:
+                response.raise_for_status()
+                return await response.read()
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching schedule: {e!r}")
+            return None
+    
+    def _new_session(self) -> aiohttp.ClientSession:
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(limit=self.limit)
+        
+        return aiohttp.ClientSession(
+            connector=self._connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            headers=AJAX_HEADERS,
+            timeout=self.timeout
+        )
+
+
+def page_matches_date(content: bytes, day: date) -> bool:
+    """
+    Check that the day page shows the requested date.
+    
+    The page caption reads like "Расписание занятий на среду, 17 декабря
+    2025 года". Pages without a caption are accepted as is.
+    
+    Args:
+        content: Raw HTML of the day page
+        day: Requested date
+    
+    Returns:
+        False if the caption names a different date
+    """
+    if "Расписание занятий на".encode() not in content:
+        return True
+    caption_date = f"{day.day} {MONTHS_GENITIVE[day.month]} {day.year}"
+    return caption_date.encode() in content
+
+
+# Shared fetcher used by the bot
+schedule_fetcher = ScheduleFetcher(pool_size=FETCH_SESSIONS)
@@ -0,0 +1,134 @@
+"""
+Registry of the groups found on the schedule pages.
+"""
+
+import bisect
+import sqlite3
+from typing import List, Optional, Sequence, Tuple
+
+from config import GROUPS
+from database import AsyncDatabase, db
+from models import DaySchedule
+
+
+def group_key(name: str) -> str:
+    """
+    Search key of a group name.
+    
+    Case, "ё", hyphens and spaces are ignored, so "ис-1", "ИС 1" and "ис1"
+    all find "ИС-1-24".
+    """
+    return name.casefold().replace("ё", "е").replace("-", "").replace(" ", "")
+
+
+class GroupIndex:
+    """
+    Prefix index over group names: the search keys kept sorted.
+    
+    A search is a binary search for the first key with the prefix and a
+    walk over the following keys while they share it.
+    """
+    
+    def __init__(self, groups: Sequence[str]):
+        entries = sorted((group_key(group), group) for group in groups)
+        self._keys = [key for key, _ in entries]
+        self._groups = [group for _, group in entries]
+    
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """
+        Find groups whose name starts with the query.
+        
+        Args:
+            query: Beginning of the name, e.g. "ис-1" or "ЭКС"
+            limit: Maximum number of groups
+        
+        Returns:
+            Group names in key order, every group (up to limit) for an
+            empty query
+        """
+        prefix = group_key(query)
+        start = bisect.bisect_left(self._keys, prefix)
+        groups = []
+        for key, group in zip(self._keys[start:start + limit], self._groups[start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            groups.append(group)
+        return groups
+
+
+class GroupRegistry:
+    """
+    Persisted list of every group seen on the site.
+    
+    Each loaded day page reports its header groups. When a page brings a
+    group not seen before, it is appended to the stored list, which hands
+    out the position and a new version, and the list is read back, so new
+    intake years appear in the group keyboard without a code change.
+    
+    Groups are only ever appended in the database, never moved or dropped
+    (e.g. a group on practice that day), so every process's list is a
+    prefix of the stored one and a position names the same group in all
+    of them. The list is seeded from config.GROUPS on first start.
+    """
+    
+    def __init__(self, database: AsyncDatabase, seed: Sequence[str] = GROUPS):
+        self.database = database
+        self._groups: Tuple[str, ...] = tuple(seed)
+        self._known = set(self._groups)
+        self._index: Optional[GroupIndex] = None
+        self.version = 0
+    
+    @property
+    def groups(self) -> Tuple[str, ...]:
+        """Group names by position."""
+        return self._groups
+    
+    def index(self, group: str) -> int:
+        """Position of a group, stable across versions."""
+        return self._groups.index(group)
+    
+    def __contains__(self, group: str) -> bool:
+        return group in self._known
+    
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """Find groups by the beginning of the name, see GroupIndex.search."""
+        if self._index is None:
+            self._index = GroupIndex(self._groups)
+        return self._index.search(query, limit)
+    
+    async def load(self):
+        """Read the stored registry, or store the seed if there is none yet."""
+        groups, version = await self.database.get_group_registry()
+        if not groups:
+            # Another process seeding at the same time adds nothing twice
+            groups, version = await self.database.add_groups(self._groups)
+        self._set(groups, version)
+    
+    async def observe(self, day_schedule: DaySchedule):
+        """
+        Add the groups of a loaded day page.
+        
+        Only a page with a new group changes the registry, every other call
+        is a set comparison.
+        """
+        page = list(day_schedule.groups)
+        if not page or self._known.issuperset(page):
+            return
+        
+        added = [group for group in dict.fromkeys(page) if group not in self._known]
+        print(f"New groups on the {day_schedule.date} page: {', '.join(added)}")
+        try:
+            # Read back with the groups other processes added meanwhile
+            self._set(*await self.database.add_groups(added))
+        except sqlite3.Error as e:
+            print(f"Error saving group registry: {e}")
+    
+    def _set(self, groups: Sequence[str], version: int):
+        self._groups = tuple(groups)
+        self._known = set(groups)
+        self._index = None
+        self.version = version
+
+
+# Shared registry used by the keyboards and the schedule cache
+group_registry = GroupRegistry(db)
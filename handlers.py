@@ -1,16 +1,28 @@
+from datetime import date
+from typing import Optional
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import (
+    Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQuery, InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent
+)
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from keyboards import get_groups_keyboard, get_date_keyboard, get_back_keyboard
-from parser import fetch_schedule, format_schedule
-from database import Database
-
-
-# Initialize database
-db = Database()
+from keyboards import (
+    GroupCallback, LookupCallback, LookupKind, PickedDayCallback, ScheduleAction, ScheduleCallback,
+    get_groups_keyboard, get_date_keyboard, get_date_picker_keyboard, get_back_keyboard,
+    get_lookup_day_keyboard, get_teacher_choice_keyboard, get_free_rooms_keyboard, get_subgroup_keyboard
+)
+from config import INLINE_CACHE_TIME, INLINE_MAX_GROUPS, REMINDER_MINUTES
+from database import db
+from groups import group_registry
+from lookup import day_indexes
+from parser import get_school_days, get_target_date
+from renderer import day_label, message_renderer, render_free_rooms, render_room_day, render_teacher_day
+from schedule_cache import schedule_cache
+from profiles import profiles
 
 
 # Define FSM states
@@ -18,23 +30,38 @@ class ScheduleStates(StatesGroup):
     waiting_for_group = State()
     group_selected = State()
     setting_default_group = State()
+    waiting_for_teacher = State()
+    waiting_for_room = State()
 
 
 # Create router
 router = Router()
 
+# School days shown by the week view and offered by the date picker
+WEEK_DAYS = 6
+DATE_PICKER_DAYS = 12
+
 
 def get_main_menu_keyboard(has_default_group: bool = False):
     """Get main menu keyboard with My Group button if user has a default group."""
     buttons = []
     
     if has_default_group:
-        buttons.append([InlineKeyboardButton(text="📚 Моя группа", callback_data="my_group")])
+        buttons.append([
+            InlineKeyboardButton(text="📚 Моя группа", callback_data="my_group"),
+            InlineKeyboardButton(text="👥 Подгруппа", callback_data="choose_subgroup")
+        ])
     
     buttons.extend([
         [InlineKeyboardButton(text="🔍 Выбрать группу", callback_data="select_group")],
         [InlineKeyboardButton(text="⚙️ Установить мою группу", callback_data="set_default_group")],
-        [InlineKeyboardButton(text="🔔 Уведомления (вкл/выкл)", callback_data="toggle_notifications")]
+        [
+            InlineKeyboardButton(text="👨‍🏫 Преподаватель", callback_data="find_teacher"),
+            InlineKeyboardButton(text="🚪 Аудитория", callback_data="find_room")
+        ],
+        [InlineKeyboardButton(text="🆓 Свободные аудитории", callback_data="free_rooms")],
+        [InlineKeyboardButton(text="🔔 Уведомления (вкл/выкл)", callback_data="toggle_notifications")],
+        [InlineKeyboardButton(text="⏰ Напоминания о парах (вкл/выкл)", callback_data="toggle_reminders")]
     ])
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -48,7 +75,7 @@ async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
     
     user_id = message.from_user.id
-    default_group = db.get_default_group(user_id)
+    default_group = (await profiles.get(user_id)).default_group
     
     welcome_text = "👋 Привет! Я бот для просмотра расписания ЛНТРТ.\n\n"
     
@@ -77,12 +104,30 @@ async def handle_page_navigation(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("group:"))
-async def handle_group_selection(callback: CallbackQuery, state: FSMContext):
+async def resolve_group(index: int) -> Optional[str]:
     """
-    Handle group selection - save to state and show date options or save as default.
+    Name of the group at a registry position taken from callback data.
+    
+    Positions are append-only, so one within the local list always names
+    the group the button was made for. A position beyond it was added by
+    another process since the registry was loaded here, so the registry is
+    read again; a position still unknown after that is rejected.
     """
-    group = callback.data.split(":")[1]
+    if index >= len(group_registry.groups):
+        await group_registry.load()
+    groups = group_registry.groups
+    return groups[index] if 0 <= index < len(groups) else None
+
+
+@router.callback_query(GroupCallback.filter())
+async def handle_group_selection(callback: CallbackQuery, callback_data: GroupCallback, state: FSMContext):
+    """
+    Handle group selection - show date options or save as default.
+    """
+    group = await resolve_group(callback_data.group)
+    if group is None:
+        await callback.answer("❌ Группа не найдена. Начните с /start", show_alert=True)
+        return
     
     # Check current state
     current_state = await state.get_state()
@@ -90,7 +135,7 @@ async def handle_group_selection(callback: CallbackQuery, state: FSMContext):
     if current_state == ScheduleStates.setting_default_group:
         # User is setting their default group
         user_id = callback.from_user.id
-        db.set_default_group(user_id, group)
+        await profiles.set_default_group(user_id, group)
         
         await state.clear()
         
@@ -103,78 +148,154 @@ async def handle_group_selection(callback: CallbackQuery, state: FSMContext):
         )
         await callback.answer("Группа сохранена!")
     else:
-        # Regular group selection for viewing schedule
-        # Save selected group to state
-        await state.update_data(group=group)
-        await state.set_state(ScheduleStates.group_selected)
-        
+        # Regular group selection for viewing schedule, the date buttons
+        # carry the group
         await callback.message.edit_text(
             f"✅ Вы выбрали группу: {group}\n\n"
             "📅 Выберите день:",
-            reply_markup=get_date_keyboard()
+            reply_markup=get_date_keyboard(callback_data.group)
         )
         await callback.answer()
 
 
-@router.callback_query(F.data.startswith("date:"))
-async def handle_date_selection(callback: CallbackQuery, state: FSMContext):
+async def user_subgroup(user_id: int, group: str) -> int:
     """
-    Handle date selection - fetch and send schedule.
+    Subgroup to filter a group's lessons by: the user's subgroup when the
+    group is the user's own, 0 (all lessons) otherwise.
     """
-    date_type = callback.data.split(":")[1]
-    days_offset = 0 if date_type == "today" else 1
-    
-    # Get selected group from state
-    user_data = await state.get_data()
-    group = user_data.get("group")
+    profile = await profiles.get(user_id)
+    return profile.subgroup if group == profile.default_group else 0
+
+
+async def send_day_schedule(message: Message, group: str, day: date, subgroup: int = 0):
+    """
+    Send the schedule of a group on one date.
+    """
+    # Get schedule (served from cache when possible)
+    day_schedule = await schedule_cache.get_day(day)
     
-    if not group:
-        await callback.answer("❌ Группа не выбрана. Начните с /start", show_alert=True)
+    if day_schedule is None:
+        await message.answer(
+            "❌ Не удалось загрузить расписание. Попробуйте позже.",
+            reply_markup=get_back_keyboard()
+        )
         return
     
-    # Show loading message
-    await callback.answer("⏳ Загружаю расписание...")
+    # Send the schedule, rendered once per group and day
+    days_offset = (day - get_target_date(0)).days
+    schedule_text = message_renderer.render(day_schedule, group, days_offset, subgroup=subgroup)
     
-    # Fetch schedule
-    lessons = fetch_schedule(group, days_offset)
+    await message.answer(
+        schedule_text,
+        reply_markup=get_back_keyboard()
+    )
+
+
+async def send_week_schedule(message: Message, group: str, subgroup: int = 0):
+    """
+    Send the schedule of a group for the coming school days.
+    """
+    # All days are loaded in parallel, cached ones are served from memory
+    day_schedules = await schedule_cache.get_days(get_school_days(WEEK_DAYS))
     
-    if lessons is None:
-        await callback.message.answer(
+    if all(day_schedule is None for day_schedule in day_schedules.values()):
+        await message.answer(
             "❌ Не удалось загрузить расписание. Попробуйте позже.",
             reply_markup=get_back_keyboard()
         )
+        return
+    
+    texts = message_renderer.render_week(day_schedules, group, subgroup=subgroup)
+    for text in texts[:-1]:
+        await message.answer(text)
+    await message.answer(texts[-1], reply_markup=get_back_keyboard())
+
+
+@router.callback_query(ScheduleCallback.filter())
+async def handle_date_selection(callback: CallbackQuery, callback_data: ScheduleCallback):
+    """
+    Handle date selection - fetch and send schedule, or show the date picker.
+    """
+    group = await resolve_group(callback_data.group)
+    if group is None:
+        await callback.answer("❌ Группа не найдена. Начните с /start", show_alert=True)
+        return
+    
+    action = callback_data.action
+    if action == ScheduleAction.PICK:
+        await callback.message.edit_reply_markup(
+            reply_markup=get_date_picker_keyboard(callback_data.group, get_school_days(DATE_PICKER_DAYS))
+        )
+        await callback.answer()
+        return
+    
+    if action == ScheduleAction.MENU:
+        await callback.message.edit_reply_markup(reply_markup=get_date_keyboard(callback_data.group))
+        await callback.answer()
+        return
+    
+    # Show loading message
+    await callback.answer("⏳ Загружаю расписание...")
+    
+    subgroup = await user_subgroup(callback.from_user.id, group)
+    if action == ScheduleAction.WEEK:
+        await send_week_schedule(callback.message, group, subgroup)
     else:
-        # Format and send schedule
-        schedule_text = format_schedule(lessons, group, days_offset)
-        
-        await callback.message.answer(
-            schedule_text,
-            reply_markup=get_back_keyboard()
+        await send_day_schedule(callback.message, group, get_target_date(callback_data.offset), subgroup)
+
+
+@router.callback_query(PickedDayCallback.filter())
+async def handle_day_selection(callback: CallbackQuery, callback_data: PickedDayCallback):
+    """
+    Handle a date chosen in the date picker - fetch and send schedule.
+    """
+    group = await resolve_group(callback_data.group)
+    if group is None:
+        await callback.answer("❌ Группа не найдена. Начните с /start", show_alert=True)
+        return
+    
+    day = date.fromordinal(callback_data.day)
+    if day < get_target_date(0):
+        await callback.answer("❌ Этот день уже прошёл, выберите другой", show_alert=True)
+        await callback.message.edit_reply_markup(
+            reply_markup=get_date_picker_keyboard(callback_data.group, get_school_days(DATE_PICKER_DAYS))
         )
+        return
+    
+    await callback.answer("⏳ Загружаю расписание...")
+    await send_day_schedule(callback.message, group, day, await user_subgroup(callback.from_user.id, group))
 
 
+@router.callback_query(F.data.startswith(("group:", "date:", "day:")))
+async def handle_outdated_buttons(callback: CallbackQuery):
+    """
+    Answer buttons of menus sent before the group moved into the callback data.
+    """
+    await callback.answer("⌛ Это меню устарело. Начните с /start", show_alert=True)
 
 
 @router.callback_query(F.data == "my_group")
-async def handle_my_group(callback: CallbackQuery, state: FSMContext):
+async def handle_my_group(callback: CallbackQuery):
     """
     Show schedule for user's default group.
     """
     user_id = callback.from_user.id
-    group = db.get_default_group(user_id)
+    group = (await profiles.get(user_id)).default_group
     
     if not group:
         await callback.answer("❌ У вас не установлена группа по умолчанию", show_alert=True)
         return
     
-    # Save group to state
-    await state.update_data(group=group)
-    await state.set_state(ScheduleStates.group_selected)
+    if group not in group_registry:
+        await group_registry.load()
+        if group not in group_registry:
+            await callback.answer("❌ Группа не найдена, выберите её заново", show_alert=True)
+            return
     
     await callback.message.edit_text(
         f"✅ Группа: {group}\n\n"
         "📅 Выберите день:",
-        reply_markup=get_date_keyboard()
+        reply_markup=get_date_keyboard(group_registry.index(group))
     )
     await callback.answer()
 
@@ -215,16 +336,17 @@ async def handle_toggle_notifications(callback: CallbackQuery):
     Toggle notifications on/off.
     """
     user_id = callback.from_user.id
-    current_state = db.get_notifications_enabled(user_id)
-    new_state = not current_state
+    # The cached copy may predate a change made through another process
+    profile = await profiles.get(user_id, fresh=True)
+    new_state = not profile.notifications_enabled
     
-    db.set_notifications(user_id, new_state)
+    profile = await profiles.set_notifications(user_id, new_state)
     
     status_emoji = "🔔" if new_state else "🔕"
     status_text = "включены" if new_state else "выключены"
     
     # Check if user has default group
-    default_group = db.get_default_group(user_id)
+    default_group = profile.default_group
     
     message = f"{status_emoji} Уведомления **{status_text}**\n\n"
     
@@ -243,6 +365,38 @@ async def handle_toggle_notifications(callback: CallbackQuery):
     await callback.answer(f"Уведомления {status_text}")
 
 
+@router.callback_query(F.data == "toggle_reminders")
+async def handle_toggle_reminders(callback: CallbackQuery):
+    """
+    Toggle reminders before each pair of the default group on/off.
+    """
+    user_id = callback.from_user.id
+    profile = await profiles.get(user_id, fresh=True)
+    
+    if not profile.default_group and not profile.reminders:
+        await callback.answer("❌ Сначала установите группу по умолчанию", show_alert=True)
+        return
+    
+    new_state = not profile.reminders
+    profile = await profiles.set_reminders(user_id, new_state)
+    
+    status_text = "включены" if new_state else "выключены"
+    message = f"⏰ Напоминания о парах **{status_text}**\n\n"
+    if new_state:
+        message += (
+            f"✅ За {REMINDER_MINUTES} минут до каждой пары группы **{profile.default_group}** "
+            "придёт сообщение с предметом и аудиторией\n\n"
+        )
+    message += "Выберите действие:"
+    
+    await callback.message.edit_text(
+        message,
+        reply_markup=get_main_menu_keyboard(has_default_group=bool(profile.default_group)),
+        parse_mode="Markdown"
+    )
+    await callback.answer(f"Напоминания {status_text}")
+
+
 @router.callback_query(F.data == "back_to_main")
 async def handle_back_to_main(callback: CallbackQuery, state: FSMContext):
     """
@@ -251,7 +405,7 @@ async def handle_back_to_main(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     
     user_id = callback.from_user.id
-    default_group = db.get_default_group(user_id)
+    default_group = (await profiles.get(user_id)).default_group
     
     welcome_text = "📚 Главное меню\n\n"
     
@@ -288,3 +442,253 @@ async def handle_ignore(callback: CallbackQuery):
     Handle ignored callbacks (like page counter button).
     """
     await callback.answer()
+
+
+@router.callback_query(F.data == "find_teacher")
+async def handle_find_teacher(callback: CallbackQuery, state: FSMContext):
+    """
+    Start teacher lookup - ask for the name.
+    """
+    await state.set_state(ScheduleStates.waiting_for_teacher)
+    
+    await callback.message.edit_text(
+        "👨‍🏫 Введите фамилию преподавателя (можно начало, например «Иван»):",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")]
+        ])
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "find_room")
+async def handle_find_room(callback: CallbackQuery, state: FSMContext):
+    """
+    Start room lookup - ask for the room.
+    """
+    await state.set_state(ScheduleStates.waiting_for_room)
+    
+    await callback.message.edit_text(
+        "🚪 Введите номер аудитории (например «26»):",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")]
+        ])
+    )
+    await callback.answer()
+
+
+async def lookup_teacher_day(name: str, days_offset: int) -> str:
+    """
+    Build the message with a teacher's lessons across all groups.
+    """
+    day = get_target_date(days_offset)
+    day_schedule = await schedule_cache.get_day(day)
+    if day_schedule is None:
+        return "❌ Не удалось загрузить расписание. Попробуйте позже."
+    
+    index = day_indexes.get(day_schedule)
+    # A key from a button finds the name as shown on the site
+    name = day_indexes.teacher_name(name) or name
+    return render_teacher_day(name, index.teacher_lessons(name), day, days_offset)
+
+
+async def lookup_room_day(room: str, days_offset: int) -> str:
+    """
+    Build the message with the lessons held in a room across all groups.
+    """
+    day = get_target_date(days_offset)
+    day_schedule = await schedule_cache.get_day(day)
+    if day_schedule is None:
+        return "❌ Не удалось загрузить расписание. Попробуйте позже."
+    
+    index = day_indexes.get(day_schedule)
+    room = index.room_name(room) or day_indexes.room_name(room) or room
+    return render_room_day(room, index.room_lessons(room), day, days_offset)
+
+
+@router.message(ScheduleStates.waiting_for_teacher, F.text)
+async def handle_teacher_query(message: Message):
+    """
+    Find teachers by the beginning of the name and show the match.
+    """
+    # Teachers with lessons today or tomorrow
+    names = []
+    day_schedules = await schedule_cache.get_days([get_target_date(0), get_target_date(1)])
+    for day_schedule in day_schedules.values():
+        if day_schedule is not None:
+            for name in day_indexes.get(day_schedule).search_teachers(message.text):
+                if name not in names:
+                    names.append(name)
+    
+    if not names:
+        await message.answer(
+            "❌ Преподаватель не найден на сегодня и завтра. Попробуйте ещё раз:"
+        )
+    elif len(names) == 1:
+        await message.answer(
+            await lookup_teacher_day(names[0], 0),
+            reply_markup=get_lookup_day_keyboard(LookupKind.TEACHER, names[0], 0)
+        )
+    else:
+        await message.answer(
+            "🔍 Найдено несколько преподавателей, выберите:",
+            reply_markup=get_teacher_choice_keyboard(names)
+        )
+
+
+@router.message(ScheduleStates.waiting_for_room, F.text)
+async def handle_room_query(message: Message):
+    """
+    Show the lessons held in a room today.
+    """
+    # Room names are short, longer input is not a room
+    room = message.text.strip()[:20]
+    
+    await message.answer(
+        await lookup_room_day(room, 0),
+        reply_markup=get_lookup_day_keyboard(LookupKind.ROOM, room, 0)
+    )
+
+
+@router.callback_query(LookupCallback.filter())
+async def handle_lookup_day(callback: CallbackQuery, callback_data: LookupCallback):
+    """
+    Show a teacher's lessons, or the lessons held in a room, on the chosen day.
+    """
+    lookup_day = lookup_teacher_day if callback_data.kind == LookupKind.TEACHER else lookup_room_day
+    
+    await callback.message.edit_text(
+        await lookup_day(callback_data.key, callback_data.offset),
+        reply_markup=get_lookup_day_keyboard(callback_data.kind, callback_data.key, callback_data.offset)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "free_rooms")
+@router.callback_query(F.data.startswith("free_day:"))
+async def handle_free_rooms(callback: CallbackQuery):
+    """
+    Show the pair choice for the free room search.
+    """
+    days_offset = int(callback.data.split(":")[1]) if ":" in callback.data else 0
+    day_name = "сегодня" if days_offset == 0 else "завтра"
+    
+    await callback.message.edit_text(
+        f"🆓 Свободные аудитории на {day_name}\n\nВыберите пару:",
+        reply_markup=get_free_rooms_keyboard(days_offset)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("free:"))
+async def handle_free_rooms_pairs(callback: CallbackQuery):
+    """
+    Show the rooms free during the chosen pairs.
+    """
+    _, offset, mask = callback.data.split(":")
+    days_offset = int(offset)
+    pairs = [pair for pair in range(1, int(mask).bit_length()) if int(mask) >> pair & 1]
+    
+    day = get_target_date(days_offset)
+    day_schedule = await schedule_cache.get_day(day)
+    if day_schedule is None:
+        await callback.answer("❌ Не удалось загрузить расписание. Попробуйте позже.", show_alert=True)
+        return
+    
+    # Rooms from stored snapshots, so rooms unused on the indexed days are
+    # known too; indexing a day for a lookup fills known_rooms before this
+    if not day_indexes.snapshot_rooms_loaded:
+        day_indexes.add_snapshot_rooms(await db.get_known_rooms())
+    
+    index = day_indexes.get(day_schedule)
+    rooms = index.occupancy.free_rooms(pairs, day_indexes.known_rooms)
+    
+    await callback.message.edit_text(
+        render_free_rooms(rooms, pairs, day, days_offset),
+        reply_markup=get_free_rooms_keyboard(days_offset)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "choose_subgroup")
+async def handle_choose_subgroup(callback: CallbackQuery):
+    """
+    Show subgroup choice for the user's default group.
+    """
+    profile = await profiles.get(callback.from_user.id)
+    
+    await callback.message.edit_text(
+        f"👥 **Подгруппа в группе {profile.default_group}**\n\n"
+        "На разделённых парах будут показаны только занятия вашей подгруппы:",
+        reply_markup=get_subgroup_keyboard(profile.subgroup),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("subgroup:"))
+async def handle_subgroup_selection(callback: CallbackQuery):
+    """
+    Save the chosen subgroup.
+    """
+    subgroup = int(callback.data.split(":")[1])
+    profile = await profiles.set_subgroup(callback.from_user.id, subgroup)
+    
+    await callback.message.edit_reply_markup(
+        reply_markup=get_subgroup_keyboard(profile.subgroup)
+    )
+    await callback.answer("Подгруппа сохранена!" if subgroup else "Показываю всю группу")
+
+
+@router.inline_query()
+async def handle_inline_query(inline_query: InlineQuery):
+    """
+    Answer "@bot ИС-1-24" in any chat with today's and tomorrow's schedule
+    of the groups starting with the query.
+    
+    Only days already in the schedule cache are offered, an inline query
+    never waits for the site. An empty query offers the user's own group
+    first.
+    """
+    query = inline_query.query.strip()
+    groups = group_registry.search(query, INLINE_MAX_GROUPS)
+    if not query:
+        default_group = (await profiles.get(inline_query.from_user.id)).default_group
+        if default_group in group_registry:
+            others = [group for group in groups if group != default_group]
+            groups = [default_group] + others[:INLINE_MAX_GROUPS - 1]
+    
+    days = []
+    for days_offset in (0, 1):
+        day_schedule = await schedule_cache.get_cached_day(get_target_date(days_offset))
+        if day_schedule is not None:
+            days.append((days_offset, day_schedule))
+    
+    results = []
+    for group in groups:
+        position = group_registry.index(group)
+        for days_offset, day_schedule in days:
+            lessons = [lesson for lesson in day_schedule.lessons(group) if not lesson.is_empty]
+            results.append(InlineQueryResultArticle(
+                id=f"{position}-{day_schedule.date:%Y%m%d}",
+                title=f"{group} — {day_label(days_offset)}",
+                description=f"{day_schedule.date:%d.%m}, пар: {len(lessons)}",
+                input_message_content=InputTextMessageContent(
+                    message_text=message_renderer.render(day_schedule, group, days_offset)
+                )
+            ))
+    
+    if not results:
+        # Nothing to cache, let the next keystroke ask again
+        await inline_query.answer(
+            [],
+            cache_time=5,
+            is_personal=not query,
+            button=InlineQueryResultsButton(
+                text="❌ Группа не найдена" if not groups else "⏳ Расписание ещё не загружено",
+                start_parameter="inline"
+            )
+        )
+        return
+    
+    # Results depend on the user only when the own group is put first
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=not query)
@@ -1,35 +1,136 @@
+from datetime import date
+from enum import Enum
+from typing import Dict, Sequence, Tuple
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from config import GROUPS, GROUPS_PER_PAGE
+from config import GROUPS_PER_PAGE
+from groups import group_registry
+from lookup import (
+    AFTERNOON_PAIRS, MORNING_PAIRS, PAIRS_PER_DAY, callback_key, normalize_room, normalize_teacher, pairs_mask
+)
+from models import ROMAN_NUMERALS
+
+
+WEEKDAY_SHORT = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
+# Date buttons per row in the date picker
+DAYS_PER_ROW = 3
+
+# Prebuilt group keyboard pages and the registry version they were built from
+_group_pages: Dict[int, InlineKeyboardMarkup] = {}
+_group_pages_version = -1
+
+# Prebuilt date menus per group position, and date pickers per group
+# position and first offered date
+_date_keyboards: Dict[int, InlineKeyboardMarkup] = {}
+_date_pickers: Dict[Tuple[int, date], InlineKeyboardMarkup] = {}
+
+
+class GroupCallback(CallbackData, prefix="g"):
+    """A group button; the group is its position in the group registry."""
+    
+    group: int
+
+
+class LookupKind(str, Enum):
+    TEACHER = "t"
+    ROOM = "r"
+
+
+class LookupCallback(CallbackData, prefix="l"):
+    """
+    A teacher or room lookup on the day offset days from today.
+    
+    The teacher or room travels as its search key cut to fit the 64 bytes
+    of callback data (lookup.callback_key), not as the name typed or shown.
+    """
+    
+    kind: LookupKind
+    offset: int
+    key: str
+
+
+class ScheduleAction(str, Enum):
+    DAY = "d"
+    WEEK = "w"
+    PICK = "p"
+    MENU = "m"
+
+
+class ScheduleCallback(CallbackData, prefix="s"):
+    """
+    A button of a group's date menu.
+    
+    DAY shows the day offset days from today, WEEK the coming school days,
+    PICK opens the date picker and MENU returns to the date menu. The group
+    travels in the button, so no FSM state is read.
+    """
+    
+    action: ScheduleAction
+    group: int
+    offset: int = 0
+
+
+class PickedDayCallback(CallbackData, prefix="pd"):
+    """A date of the date picker, as date.toordinal()."""
+    
+    group: int
+    day: int
 
 
 def get_groups_keyboard(page: int = 0) -> InlineKeyboardMarkup:
     """
     Creates a paginated inline keyboard with groups.
     
+    Pages are built from the group registry once and reused until the
+    registry gets a new version.
+    
     Args:
         page: Current page number (0-indexed)
     
     Returns:
         InlineKeyboardMarkup with group buttons and navigation
     """
-    total_pages = (len(GROUPS) - 1) // GROUPS_PER_PAGE + 1
+    global _group_pages_version
+    
+    if group_registry.version != _group_pages_version:
+        _group_pages.clear()
+        _group_pages_version = group_registry.version
+    
+    keyboard = _group_pages.get(page)
+    if keyboard is None:
+        keyboard = _group_pages[page] = build_groups_page(group_registry.groups, page)
+    return keyboard
+
+
+def build_groups_page(groups: Sequence[str], page: int) -> InlineKeyboardMarkup:
+    """
+    Build one page of the group keyboard.
+    
+    Args:
+        groups: All group names in display order
+        page: Page number (0-indexed)
+    
+    Returns:
+        InlineKeyboardMarkup with group buttons and navigation
+    """
+    total_pages = (len(groups) - 1) // GROUPS_PER_PAGE + 1
     start_idx = page * GROUPS_PER_PAGE
-    end_idx = min(start_idx + GROUPS_PER_PAGE, len(GROUPS))
+    end_idx = min(start_idx + GROUPS_PER_PAGE, len(groups))
     
     buttons = []
     
     # Add group buttons (2 per row)
-    current_groups = GROUPS[start_idx:end_idx]
-    for i in range(0, len(current_groups), 2):
+    for i in range(start_idx, end_idx, 2):
         row = []
         row.append(InlineKeyboardButton(
-            text=current_groups[i],
-            callback_data=f"group:{current_groups[i]}"
+            text=groups[i],
+            callback_data=GroupCallback(group=i).pack()
         ))
-        if i + 1 < len(current_groups):
+        if i + 1 < end_idx:
             row.append(InlineKeyboardButton(
-                text=current_groups[i + 1],
-                callback_data=f"group:{current_groups[i + 1]}"
+                text=groups[i + 1],
+                callback_data=GroupCallback(group=i + 1).pack()
             ))
         buttons.append(row)
     
@@ -57,26 +158,208 @@ def get_groups_keyboard(page: int = 0) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_date_keyboard() -> InlineKeyboardMarkup:
+def get_date_keyboard(group: int) -> InlineKeyboardMarkup:
     """
-    Creates inline keyboard with today/tomorrow buttons.
+    Creates inline keyboard with today/tomorrow, week and date picker buttons.
+    
+    Built once per group, the buttons do not change.
+    
+    Args:
+        group: Position of the group in the group registry
     
     Returns:
         InlineKeyboardMarkup with date selection buttons
     """
+    keyboard = _date_keyboards.get(group)
+    if keyboard is not None:
+        return keyboard
+    
+    def button(text: str, action: ScheduleAction, offset: int = 0) -> InlineKeyboardButton:
+        return InlineKeyboardButton(
+            text=text,
+            callback_data=ScheduleCallback(action=action, group=group, offset=offset).pack()
+        )
+    
     buttons = [
         [
-            InlineKeyboardButton(text="📅 Сегодня", callback_data="date:today"),
-            InlineKeyboardButton(text="📅 Завтра", callback_data="date:tomorrow")
+            button("📅 Сегодня", ScheduleAction.DAY, 0),
+            button("📅 Завтра", ScheduleAction.DAY, 1)
+        ],
+        [
+            button("🗓 Неделя", ScheduleAction.WEEK),
+            button("📆 Другой день", ScheduleAction.PICK)
         ],
         [
             InlineKeyboardButton(text="🔙 Назад к выбору группы", callback_data="back_to_groups")
         ]
     ]
     
+    keyboard = _date_keyboards[group] = InlineKeyboardMarkup(inline_keyboard=buttons)
+    return keyboard
+
+
+def get_date_picker_keyboard(group: int, days: Sequence[date]) -> InlineKeyboardMarkup:
+    """
+    Creates inline keyboard with a button per date.
+    
+    Built once per group and day; pickers of past days are dropped.
+    
+    Args:
+        group: Position of the group in the group registry
+        days: Dates to offer
+    
+    Returns:
+        InlineKeyboardMarkup with date buttons and a back button
+    """
+    key = (group, days[0])
+    keyboard = _date_pickers.get(key)
+    if keyboard is not None:
+        return keyboard
+    
+    buttons = []
+    for i in range(0, len(days), DAYS_PER_ROW):
+        buttons.append([
+            InlineKeyboardButton(
+                text=f"{WEEKDAY_SHORT[day.weekday()]} {day:%d.%m}",
+                callback_data=PickedDayCallback(group=group, day=day.toordinal()).pack()
+            )
+            for day in days[i:i + DAYS_PER_ROW]
+        ])
+    
+    buttons.append([
+        InlineKeyboardButton(
+            text="🔙 Назад",
+            callback_data=ScheduleCallback(action=ScheduleAction.MENU, group=group).pack()
+        )
+    ])
+    
+    for old_key in [old_key for old_key in _date_pickers if old_key[1] != days[0]]:
+        del _date_pickers[old_key]
+    keyboard = _date_pickers[key] = InlineKeyboardMarkup(inline_keyboard=buttons)
+    return keyboard
+
+
+def get_teacher_choice_keyboard(names: Sequence[str]) -> InlineKeyboardMarkup:
+    """
+    Creates inline keyboard with a button per teacher found by a search.
+    
+    Args:
+        names: Teacher names as shown on the site
+    
+    Returns:
+        InlineKeyboardMarkup with teacher buttons and a main menu button
+    """
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"👨‍🏫 {name}",
+            callback_data=LookupCallback(
+                kind=LookupKind.TEACHER, offset=0, key=callback_key(normalize_teacher(name))
+            ).pack()
+        )]
+        for name in names
+    ]
+    buttons.append([
+        InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")
+    ])
+    
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_lookup_day_keyboard(kind: LookupKind, value: str, days_offset: int) -> InlineKeyboardMarkup:
+    """
+    Creates inline keyboard switching a teacher or room lookup between days.
+    
+    Args:
+        kind: Teacher or room lookup
+        value: Teacher name or room, or its search key
+        days_offset: Day currently shown (0 = today, 1 = tomorrow)
+    
+    Returns:
+        InlineKeyboardMarkup with today/tomorrow and main menu buttons
+    """
+    normalize = normalize_teacher if kind == LookupKind.TEACHER else normalize_room
+    key = callback_key(normalize(value))
+    days = []
+    for offset, text in ((0, "📅 Сегодня"), (1, "📅 Завтра")):
+        if offset != days_offset:
+            days.append(InlineKeyboardButton(
+                text=text,
+                callback_data=LookupCallback(kind=kind, offset=offset, key=key).pack()
+            ))
+    
+    return InlineKeyboardMarkup(inline_keyboard=[
+        days,
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")]
+    ])
+
+
+def get_free_rooms_keyboard(days_offset: int) -> InlineKeyboardMarkup:
+    """
+    Creates inline keyboard choosing the pairs to find free rooms for.
+    
+    Callback data carries the day offset and a bitmask of the pairs.
+    
+    Args:
+        days_offset: Day currently chosen (0 = today, 1 = tomorrow)
+    
+    Returns:
+        InlineKeyboardMarkup with pair, half-day, day and main menu buttons
+    """
+    pair_buttons = [
+        InlineKeyboardButton(
+            text=f"{ROMAN_NUMERALS[pair]} пара",
+            callback_data=f"free:{days_offset}:{pairs_mask([pair])}"
+        )
+        for pair in range(1, PAIRS_PER_DAY + 1)
+    ]
+    buttons = [pair_buttons[i:i + 3] for i in range(0, len(pair_buttons), 3)]
+    
+    buttons.append([
+        InlineKeyboardButton(
+            text="🌅 Утро (I–III)",
+            callback_data=f"free:{days_offset}:{pairs_mask(MORNING_PAIRS)}"
+        ),
+        InlineKeyboardButton(
+            text="🌇 После обеда (IV–VI)",
+            callback_data=f"free:{days_offset}:{pairs_mask(AFTERNOON_PAIRS)}"
+        )
+    ])
+    
+    other_offset = 0 if days_offset else 1
+    buttons.append([
+        InlineKeyboardButton(
+            text="📅 Завтра" if other_offset == 1 else "📅 Сегодня",
+            callback_data=f"free_day:{other_offset}"
+        ),
+        InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")
+    ])
+    
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def get_subgroup_keyboard(current: int = 0) -> InlineKeyboardMarkup:
+    """
+    Creates inline keyboard choosing the user's subgroup.
+    
+    Args:
+        current: Subgroup chosen now, 0 for the whole group
+    
+    Returns:
+        InlineKeyboardMarkup with subgroup buttons and a main menu button
+    """
+    choices = ((0, "Вся группа"), (1, "1 п/гр"), (2, "2 п/гр"))
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=f"✅ {text}" if subgroup == current else text,
+                callback_data=f"subgroup:{subgroup}"
+            )
+            for subgroup, text in choices
+        ],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_main")]
+    ])
+
+
 def get_back_keyboard():
     """
     Get keyboard with back buttons.
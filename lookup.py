@@ -0,0 +1,294 @@
+"""
+Teacher and room lookups over the lessons of every group on a day.
+"""
+
+import bisect
+import difflib
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import DaySchedule, Lesson
+
+
+# Placeholder the site shows instead of a missing room or teacher
+MISSING = "нет"
+
+# Similarity a misspelled query needs to still match a name
+FUZZY_CUTOFF = 0.75
+
+# Pairs of the first and the second half of the day; not the site's
+# "I смена"/"II смена", which are separate pages with their own bells
+PAIRS_PER_DAY = 6
+MORNING_PAIRS = (1, 2, 3)
+AFTERNOON_PAIRS = (4, 5, 6)
+
+ROOM_NUMBER_PATTERN = re.compile(r'(\d+)(.*)')
+
+# Bytes of a search key carried in callback data, which is limited to 64
+# bytes in total together with the prefix and the day
+CALLBACK_KEY_BYTES = 48
+
+
+@dataclass(frozen=True, slots=True)
+class LessonEntry:
+    """A lesson together with the group that has it."""
+    
+    group: str
+    lesson: Lesson
+
+
+def normalize_teacher(name: str) -> str:
+    """
+    Search key of a teacher name.
+    
+    Case, "ё", dots and spaces are ignored, so "переверзова кс" and
+    "Переверзова К.С." share a key.
+    """
+    return name.casefold().replace("ё", "е").replace(".", "").replace(" ", "")
+
+
+def normalize_room(room: str) -> str:
+    """Search key of a room: "№26", " №26 " and "26" share a key."""
+    return normalize_teacher(room).replace("№", "")
+
+
+def callback_key(key: str, limit: int = CALLBACK_KEY_BYTES) -> str:
+    """
+    A search key cut to fit in callback data.
+    
+    The key is cut to limit UTF-8 bytes on a character boundary and loses
+    the ":" separators, a cut key still finds its name by prefix, see
+    DayIndexCache.teacher_name.
+    """
+    return key.replace(":", "").encode()[:limit].decode(errors="ignore")
+
+
+def find_by_key(names: Dict[str, str], key: str) -> Optional[str]:
+    """Name of a key, or of the only key starting with it (a cut key), else None."""
+    name = names.get(key)
+    if name is not None or not key:
+        return name
+    matches = [name for name_key, name in names.items() if name_key.startswith(key)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def room_sort_key(room: str) -> Tuple[int, int, str]:
+    """Order rooms by number ("№5" before "№28а" before "№30"), named rooms last."""
+    match = ROOM_NUMBER_PATTERN.search(room)
+    if match:
+        return 0, int(match.group(1)), match.group(2)
+    return 1, 0, room
+
+
+def pairs_mask(pairs: Iterable[int]) -> int:
+    """Bitmask with bit n set for every pair n."""
+    mask = 0
+    for pair in pairs:
+        mask |= 1 << pair
+    return mask
+
+
+class RoomOccupancy:
+    """
+    Room x pair occupancy of one day.
+    
+    Every room is an int with bit n set when pair n is held there, so the
+    check for a set of pairs is a single AND per room whatever the number
+    of pairs asked for.
+    """
+    
+    def __init__(self):
+        self._masks: Dict[str, int] = {}
+    
+    def add(self, room_key: str, pair: int):
+        self._masks[room_key] = self._masks.get(room_key, 0) | 1 << pair
+    
+    def is_free(self, room: str, pairs: Iterable[int]) -> bool:
+        return not self._masks.get(normalize_room(room), 0) & pairs_mask(pairs)
+    
+    def busy_pairs(self, room: str) -> List[int]:
+        """Pairs held in a room, ascending."""
+        mask = self._masks.get(normalize_room(room), 0)
+        return [pair for pair in range(1, mask.bit_length()) if mask >> pair & 1]
+    
+    def free_rooms(self, pairs: Iterable[int], rooms: Dict[str, str]) -> List[str]:
+        """
+        Find rooms without lessons during all of the given pairs.
+        
+        Args:
+            pairs: Pair numbers, e.g. (3,) or AFTERNOON_PAIRS
+            rooms: Every known room, key -> name as shown on the site
+        
+        Returns:
+            Names of the free rooms, ordered by number
+        """
+        mask = pairs_mask(pairs)
+        masks = self._masks
+        free = [name for key, name in rooms.items() if not masks.get(key, 0) & mask]
+        return sorted(free, key=room_sort_key)
+
+
+class DayIndex:
+    """
+    Inverted index of one day: teacher -> lessons and room -> lessons.
+    
+    Built in one pass over every group's lessons, after which a lookup is
+    one dict access. Teacher keys are also kept sorted for prefix search,
+    and the same pass fills the room occupancy of the day.
+    """
+    
+    def __init__(self, day_schedule: DaySchedule):
+        self.date = day_schedule.date
+        self._teachers: Dict[str, List[LessonEntry]] = {}
+        self._rooms: Dict[str, List[LessonEntry]] = {}
+        # Key -> name as shown on the site
+        self._teacher_names: Dict[str, str] = {}
+        self._room_names: Dict[str, str] = {}
+        self.occupancy = RoomOccupancy()
+        
+        for group, group_day in day_schedule.groups.items():
+            for lesson in group_day:
+                if lesson.is_empty:
+                    continue
+                entry = LessonEntry(group, lesson)
+                
+                teacher = lesson.teacher.strip()
+                if teacher and teacher != MISSING:
+                    key = normalize_teacher(teacher)
+                    self._teachers.setdefault(key, []).append(entry)
+                    self._teacher_names.setdefault(key, teacher)
+                
+                room = lesson.room.strip()
+                if room and room != MISSING:
+                    key = normalize_room(room)
+                    self._rooms.setdefault(key, []).append(entry)
+                    self._room_names.setdefault(key, room)
+                    self.occupancy.add(key, lesson.number)
+        
+        for entries in (*self._teachers.values(), *self._rooms.values()):
+            entries.sort(key=lambda entry: (entry.lesson.number, entry.group))
+        
+        self._teacher_keys = sorted(self._teachers)
+    
+    def teacher_lessons(self, name: str) -> List[LessonEntry]:
+        """Lessons of a teacher in pair order, empty if the name is unknown."""
+        return self._teachers.get(normalize_teacher(name), [])
+    
+    def room_lessons(self, room: str) -> List[LessonEntry]:
+        """Lessons in a room in pair order, empty if the room is unknown."""
+        return self._rooms.get(normalize_room(room), [])
+    
+    def search_teachers(self, query: str, limit: int = 10) -> List[str]:
+        """
+        Find teachers whose name starts with the query.
+        
+        Names are matched by prefix. When nothing matches, names whose
+        beginning is similar to the query are returned instead, so a typo
+        like "переверзва" still finds "Переверзова К.С.".
+        
+        Args:
+            query: Beginning of the name, e.g. "перев" or "Иванова А"
+            limit: Maximum number of names
+        
+        Returns:
+            Names as shown on the site, best matches first
+        """
+        prefix = normalize_teacher(query)
+        if not prefix:
+            return []
+        
+        start = bisect.bisect_left(self._teacher_keys, prefix)
+        names = []
+        for key in self._teacher_keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            names.append(self._teacher_names[key])
+        if names:
+            return names
+        
+        # No exact prefix, compare the query with the same-length beginnings
+        scored = []
+        for key in self._teacher_keys:
+            ratio = difflib.SequenceMatcher(None, prefix, key[:len(prefix)]).ratio()
+            if ratio >= FUZZY_CUTOFF:
+                scored.append((-ratio, key))
+        return [self._teacher_names[key] for _, key in sorted(scored)[:limit]]
+    
+    def room_name(self, room: str) -> Optional[str]:
+        """Room as shown on the site, None if no lesson is held there."""
+        return self._room_names.get(normalize_room(room))
+    
+    @property
+    def teachers(self) -> List[str]:
+        return [self._teacher_names[key] for key in self._teacher_keys]
+    
+    @property
+    def rooms(self) -> List[str]:
+        return list(self._room_names.values())
+
+
+class DayIndexCache:
+    """
+    Day indexes, built once per loaded version of a day.
+    
+    An index is rebuilt when the schedule cache hands out a new DaySchedule
+    for its date, i.e. after a reload from the site. Past dates are dropped.
+    
+    Rooms of every indexed day are remembered, together with rooms added
+    from stored snapshots, as the set a free room is searched in. Teachers
+    of every indexed day are remembered too, so the search key carried by
+    a button finds the name even on a day without the teacher's lessons.
+    """
+    
+    def __init__(self):
+        self._indexes: Dict[date, Tuple[DaySchedule, DayIndex]] = {}
+        self._known_rooms: Dict[str, str] = {}
+        self._known_teachers: Dict[str, str] = {}
+        # Rooms of the stored snapshots are read once per process
+        self.snapshot_rooms_loaded = False
+    
+    @property
+    def known_rooms(self) -> Dict[str, str]:
+        """Every room seen so far, key -> name as shown on the site."""
+        return self._known_rooms
+    
+    def add_known_rooms(self, rooms: Iterable[str]):
+        for room in rooms:
+            room = room.strip()
+            if room and room != MISSING:
+                self._known_rooms.setdefault(normalize_room(room), room)
+    
+    def teacher_name(self, key: str) -> Optional[str]:
+        """Teacher name as shown on the site for a search key, possibly cut."""
+        return find_by_key(self._known_teachers, normalize_teacher(key))
+    
+    def room_name(self, key: str) -> Optional[str]:
+        """Room as shown on the site for a search key, possibly cut."""
+        return find_by_key(self._known_rooms, normalize_room(key))
+    
+    def add_snapshot_rooms(self, rooms: Iterable[str]):
+        """Add the rooms of the stored snapshots, see snapshot_rooms_loaded."""
+        self.add_known_rooms(rooms)
+        self.snapshot_rooms_loaded = True
+    
+    def get(self, day_schedule: DaySchedule) -> DayIndex:
+        """Get the index of a day, building it on first use."""
+        entry = self._indexes.get(day_schedule.date)
+        if entry is not None and entry[0] is day_schedule:
+            return entry[1]
+        
+        index = DayIndex(day_schedule)
+        self.add_known_rooms(index.rooms)
+        for name in index.teachers:
+            self._known_teachers.setdefault(normalize_teacher(name), name)
+        today = date.today()
+        for day in [day for day in self._indexes if day < today]:
+            del self._indexes[day]
+        self._indexes[day_schedule.date] = (day_schedule, index)
+        return index
+
+
+# Shared indexes used by the handlers
+day_indexes = DayIndexCache()
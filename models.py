@@ -0,0 +1,176 @@
+"""
+Compact lesson and schedule models.
+"""
+
+import hashlib
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterator, Optional, Tuple
+
+
+ROMAN_NUMERALS = ("", "I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X")
+ROMAN_TO_INT = {numeral: number for number, numeral in enumerate(ROMAN_NUMERALS) if numeral}
+
+EMPTY_SUBJECT = "Пары нет"
+
+# Version of the page parsing, raised whenever the same page starts to
+# parse to different lessons (2: split pairs and "нет" rooms/teachers)
+PARSER_VERSION = 2
+
+
+def intern_text(text: str) -> str:
+    """
+    Intern a subject, room or teacher name.
+    
+    The same few hundred names repeat across every group and day, so cached
+    schedules share one copy of each string.
+    """
+    return sys.intern(text)
+
+
+@dataclass(frozen=True, slots=True)
+class Lesson:
+    """
+    One pair of a group, or of one subgroup when the pair is split.
+    
+    A split pair is stored as one lesson per subgroup with the same number,
+    subgroup 0 means the whole group.
+    """
+    
+    number: int
+    subject: str
+    room: str = ""
+    teacher: str = ""
+    subgroup: int = 0
+    
+    @classmethod
+    def create(
+        cls,
+        numeral: str,
+        subject: str,
+        room: str = "",
+        teacher: str = "",
+        subgroup: int = 0
+    ) -> "Lesson":
+        """Create a lesson from parsed texts with the pair given as a Roman numeral."""
+        return cls(
+            ROMAN_TO_INT.get(numeral, 0),
+            intern_text(subject),
+            intern_text(room),
+            intern_text(teacher),
+            subgroup
+        )
+    
+    @classmethod
+    def stored(
+        cls,
+        number: int,
+        subject: str,
+        room: str = "",
+        teacher: str = "",
+        subgroup: int = 0
+    ) -> "Lesson":
+        """Create a lesson from stored fields with the pair given as an int."""
+        return cls(number, intern_text(subject), intern_text(room), intern_text(teacher), subgroup)
+    
+    @property
+    def numeral(self) -> str:
+        """Pair number as shown on the site (I, II, III, ...)."""
+        if 0 < self.number < len(ROMAN_NUMERALS):
+            return ROMAN_NUMERALS[self.number]
+        return ""
+    
+    @property
+    def is_empty(self) -> bool:
+        return self.subject == EMPTY_SUBJECT
+    
+    def applies_to(self, subgroup: int) -> bool:
+        """Whether students of a subgroup attend the lesson, 0 matches every lesson."""
+        return not subgroup or not self.subgroup or self.subgroup == subgroup
+    
+    def to_dict(self) -> Dict[str, str]:
+        """Lesson in the dict format used before the model existed."""
+        return {
+            "number": self.numeral,
+            "subject": self.subject,
+            "room": self.room,
+            "teacher": self.teacher
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class GroupDay:
+    """Lessons of one group on one day."""
+    
+    group: str
+    lessons: Tuple[Lesson, ...] = ()
+    
+    def __iter__(self) -> Iterator[Lesson]:
+        return iter(self.lessons)
+    
+    def __len__(self) -> int:
+        return len(self.lessons)
+    
+    def to_dicts(self):
+        return [lesson.to_dict() for lesson in self.lessons]
+    
+    def for_subgroup(self, subgroup: int) -> Tuple[Lesson, ...]:
+        """Lessons a subgroup attends, every lesson for subgroup 0."""
+        if not subgroup:
+            return self.lessons
+        return tuple(lesson for lesson in self.lessons if lesson.applies_to(subgroup))
+    
+    def content_hash(self) -> str:
+        """Hash of the lessons, changes whenever anything in them changes."""
+        # The subgroup is only added for split pairs, so hashes of days
+        # without them stay the same as before subgroups were parsed
+        content = "\x1e".join(
+            f"{lesson.number}\x1f{lesson.subject}\x1f{lesson.room}\x1f{lesson.teacher}"
+            + (f"\x1f{lesson.subgroup}" if lesson.subgroup else "")
+            for lesson in self.lessons
+        )
+        return hashlib.sha1(content.encode()).hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class DaySchedule:
+    """Lessons of every group on one date, as shown on the day page."""
+    
+    date: date
+    groups: Dict[str, GroupDay]
+    # Shift the page is printed for, 1 for "I смена"
+    shift: int = 1
+    # Parsing the lessons come from; versions from different parsers are
+    # not compared for changes
+    parser_version: int = PARSER_VERSION
+    
+    def get(self, group: str) -> Optional[GroupDay]:
+        return self.groups.get(group)
+    
+    def lessons(self, group: str, subgroup: int = 0) -> Tuple[Lesson, ...]:
+        """Lessons of a group (or one of its subgroups), empty if the group is not on the page."""
+        group_day = self.groups.get(group)
+        return group_day.for_subgroup(subgroup) if group_day is not None else ()
+    
+    def content_hash(self) -> str:
+        """Hash of all groups' lessons, independent of group order."""
+        content = "\x1e".join(
+            f"{group}\x1f{self.groups[group].content_hash()}"
+            for group in sorted(self.groups)
+            if self.groups[group].lessons
+        )
+        return hashlib.sha1(content.encode()).hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    """Stored settings of a user."""
+    
+    user_id: int
+    default_group: Optional[str] = None
+    notifications_enabled: bool = True
+    # Subgroup within the default group, 0 if not chosen
+    subgroup: int = 0
+    # Reminder before each pair of the default group
+    reminders: bool = False
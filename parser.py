@@ -1,8 +1,32 @@
-import requests
+import asyncio
+import re
+import lxml.html
+from lxml.etree import XPath
 from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from config import SCHEDULE_URL
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Sequence
+from config import SCHEDULE_URL, PARSER_BACKEND
+from fetcher import ScheduleFetcher
+from models import DaySchedule, EMPTY_SUBJECT, GroupDay, Lesson, intern_text
+from renderer import day_label, render_lessons
+
+
+# Lesson text looks like "Subject (Room) Teacher"
+ROOM_PATTERN = re.compile(r'\((.*?)\)')
+ROOM_SPLIT_PATTERN = re.compile(r'\([^)]+\)')
+
+# Subgroup cell of a split pair ("1п/гр", "2п/гр")
+SUBGROUP_PATTERN = re.compile(r'(\d+)\s*п/гр')
+
+# Texts of a pair that is not held, spaces removed
+EMPTY_ENTRIES = {'нет(нет)нет', 'нетнетнет'}
+
+# Shift in the page header ("I смена", "II смена")
+SHIFT_PATTERN = re.compile(rb'>\s*(I{1,2})[ _]' + 'смена'.encode())
+
+# The site serves UTF-8, pages saved without a <meta> charset included
+LXML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+BORDER_TABLE_XPATH = XPath("//table[contains(concat(' ', normalize-space(@class), ' '), ' border ')]")
 
 
 def get_date_string(days_offset: int = 0) -> str:
@@ -19,10 +43,131 @@ def get_date_string(days_offset: int = 0) -> str:
     return date.strftime("%d/%m/%Y")
 
 
-def fetch_schedule(group: str, days_offset: int = 0) -> Optional[List[Dict[str, str]]]:
+def get_target_date(days_offset: int = 0) -> date:
+    """
+    Get the calendar date for a day offset.
+    
+    Args:
+        days_offset: Number of days from today (0 = today, 1 = tomorrow)
+    
+    Returns:
+        Target date
+    """
+    return (datetime.now() + timedelta(days=days_offset)).date()
+
+
+def get_school_days(count: int) -> List[date]:
+    """
+    Get the next school days starting today.
+    
+    Classes run Monday to Saturday, Sundays are skipped.
+    
+    Args:
+        count: Number of days to return
+    
+    Returns:
+        Dates in ascending order
+    """
+    days = []
+    day = get_target_date(0)
+    while len(days) < count:
+        if day.weekday() != 6:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def parse_day_page(content, backend: str = PARSER_BACKEND) -> Optional[Dict[str, GroupDay]]:
+    """
+    Parse the day page into schedules of every group on it.
+    
+    Args:
+        content: Raw HTML of the day page
+        backend: "lxml" to walk the lxml tree directly, "bs4" for BeautifulSoup;
+            both return the same lessons
+    
+    Returns:
+        Dict mapping group name to its lessons or None if the page has
+        no schedule table
+    """
+    if backend == "lxml":
+        return parse_day_page_lxml(content)
+    
+    soup = BeautifulSoup(content, 'lxml')
+    
+    # Find the schedule table
+    table = soup.find('table', class_='border')
+    if not table:
+        return None
+    
+    return parse_day_schedule(table)
+
+
+async def fetch_day_schedule_async(day: date, fetcher: ScheduleFetcher) -> Optional[DaySchedule]:
+    """
+    Fetch the day page once and parse the schedule of all groups.
+    
+    Parsing runs in a worker thread so the event loop keeps serving updates.
+    
+    Args:
+        day: Date to fetch
+        fetcher: HTTP client to download the page with
+    
+    Returns:
+        Schedule of all groups or None if error
+    """
+    content = await fetcher.fetch_day_html(day)
+    if content is None:
+        return None
+    
+    try:
+        groups = await asyncio.to_thread(parse_day_page, content)
+    except Exception as e:
+        print(f"Error parsing schedule: {e}")
+        return None
+    
+    if groups is None:
+        return None
+    return DaySchedule(day, groups, parse_shift(content))
+
+
+async def _fetch_day_schedule_once(day: date) -> Optional[DaySchedule]:
+    async with ScheduleFetcher() as fetcher:
+        return await fetch_day_schedule_async(day, fetcher)
+
+
+def parse_shift(content: bytes) -> int:
+    """
+    Get the shift a day page is printed for.
+    
+    Returns:
+        1 for "I смена", 2 for "II смена", 1 if the page does not say
+    """
+    match = SHIFT_PATTERN.search(content)
+    return len(match.group(1)) if match else 1
+
+
+def fetch_day_schedule(day: date) -> Optional[DaySchedule]:
+    """
+    Blocking variant of fetch_day_schedule_async for scripts.
+    
+    Must not be called from a running event loop.
+    
+    Args:
+        day: Date to fetch
+    
+    Returns:
+        Schedule of all groups or None if error
+    """
+    return asyncio.run(_fetch_day_schedule_once(day))
+
+
+def fetch_schedule(group: str, days_offset: int = 0) -> Optional[List[Lesson]]:
     """
     Fetch and parse schedule for a specific group.
     
+    Blocking wrapper kept for scripts, the bot uses the schedule cache.
+    
     Args:
         group: Group name (e.g., "ИС-1-24")
         days_offset: Number of days from today (0 = today, 1 = tomorrow)
@@ -30,52 +175,85 @@ def fetch_schedule(group: str, days_offset: int = 0) -> Optional[List[Dict[str,
     Returns:
         List of lessons with details or None if error
     """
-    try:
-        # Calculate the target date
-        target_date = datetime.now() + timedelta(days=days_offset)
-        date_str = target_date.strftime("%Y-%m-%d")  # YYYY-MM-DD format for API
-        
-        # Create a session to maintain cookies
-        session = requests.Session()
-        
-        # Required header for AJAX requests
-        headers = {"X-Requested-With": "XMLHttpRequest"}
-        
-        # Step 1: Set the date in session
-        save_url = "http://lntrt.ru/save"
-        save_params = {
-            "dateSched": date_str,
-            "academicYear": date_str
-        }
-        save_response = session.get(save_url, params=save_params, headers=headers, timeout=10)
-        save_response.raise_for_status()
-        
-        # Step 2: Fetch the schedule HTML  
-        schedule_url = "http://lntrt.ru/schedule/daySchedule"  # Note: /schedule not /fulltime/schedule
-        schedule_response = session.get(schedule_url, headers=headers, timeout=10)
-        # Site returns schedule data successfully with the AJAX header
-        
-        # Parse HTML
-        soup = BeautifulSoup(schedule_response.content, 'lxml')
-        
-        # Find the schedule table
-        table = soup.find('table', class_='border')
-        if not table:
-            return None
+    day_schedule = fetch_day_schedule(get_target_date(days_offset))
+    if day_schedule is None:
+        return None
+    
+    return list(day_schedule.lessons(group))
+
+
+def index_schedule_table(table) -> Dict[str, object]:
+    """
+    Map every group in the schedule table to its schedule cell in one pass.
+    
+    The table is split into blocks of four columns: a header row with group
+    names in <th style="border-bottom-width:1px"> cells, followed by a row
+    whose <td> cells hold the lessons of those groups in the same columns.
+    
+    Args:
+        table: BeautifulSoup table element
+    
+    Returns:
+        Dict mapping group name to its <td> cell, in page order
+    """
+    index = {}
+    body = table.find('tbody', recursive=False) or table
+    
+    header = None
+    for row in body.find_all('tr', recursive=False):
+        cells = row.find_all(['th', 'td'], recursive=False)
         
-        # Parse schedule for the specific group
-        lessons = parse_schedule_html(table, group)
-        return lessons
+        if header is not None:
+            for column, group in header:
+                if column < len(cells):
+                    index[group] = cells[column]
+            header = None
+            continue
         
-    except requests.RequestException as e:
-        print(f"Error fetching schedule: {e}")
-        return None
-    except Exception as e:
-        print(f"Error parsing schedule: {e}")
-        return None
+        names = [
+            (column, cell.get_text(strip=True))
+            for column, cell in enumerate(cells)
+            if cell.name == 'th'
+        ]
+        header = [(column, group) for column, group in names if group] or None
+    
+    return index
+
+
+def parse_group_cell(cell) -> List[Lesson]:
+    """
+    Parse lessons from a group's schedule cell.
+    
+    Args:
+        cell: BeautifulSoup <td> element holding one nested table per lesson
+    
+    Returns:
+        List of lessons
+    """
+    return [
+        lesson
+        for nested_table in cell.find_all('table')
+        for lesson in parse_nested_lesson_table(nested_table)
+    ]
+
+
+def parse_day_schedule(table) -> Dict[str, GroupDay]:
+    """
+    Parse schedules of all groups from the schedule table.
+    
+    Args:
+        table: BeautifulSoup table element
+    
+    Returns:
+        Dict mapping group name to its lessons
+    """
+    return {
+        group: GroupDay(intern_text(group), tuple(parse_group_cell(cell)))
+        for group, cell in index_schedule_table(table).items()
+    }
 
 
-def parse_schedule_html(table, group: str) -> List[Dict[str, str]]:
+def parse_schedule_html(table, group: str) -> List[Lesson]:
     """
     Parse HTML table to extract schedule for a specific group.
     
@@ -87,130 +265,170 @@ def parse_schedule_html(table, group: str) -> List[Dict[str, str]]:
         group: Group name to find
     
     Returns:
-        List of lessons with number, subject, room, and teacher
+        List of lessons
     """
-    lessons = []
-    
-    # Find all rows
-    rows = table.find_all('tr')
-    
-    # Find the column index for our group
-    group_column_index = None
-    
-    for row in rows:
-        # Check headers in this row
-        headers = row.find_all('th')
-        for idx, th in enumerate(headers):
-            if th.get_text(strip=True) == group:
-                group_column_index = idx
-                print(f"Found group '{group}' in column {idx}")
-                break
-        
-        if group_column_index is not None:
-            break
-    
-    if group_column_index is None:
+    cell = index_schedule_table(table).get(group)
+    if cell is None:
         print(f"Group '{group}' not found in table headers")
         return []
     
-    # Now find the row with lessons for this group
-    # It should be the next row after the header row
-    found_header_row = False
-    for row in rows:
-        # Check if this row has our group header
-        headers = row.find_all('th')
-        for th in headers:
-            if th.get_text(strip=True) == group:
-                found_header_row = True
-                break
-        
-        # If we found the header row, get the next tr with td cells
-        if found_header_row:
-            # Get the next row's cells
-            next_row = row.find_next_sibling('tr')
-            if next_row:
-                cells = next_row.find_all('td', recursive=False)
-                if len(cells) > group_column_index:
-                    # This is our group's schedule cell
-                    group_cell = cells[group_column_index]
-                    
-                    # Parse nested tables in this cell
-                    nested_tables = group_cell.find_all('table')
-                    for nested_table in nested_tables:
-                        lesson_info = parse_nested_lesson_table(nested_table)
-                        lessons.append(lesson_info)
-            break
-    
-    return lessons
+    return parse_group_cell(cell)
 
 
-def parse_nested_lesson_table(nested_table):
+def parse_nested_lesson_table(nested_table) -> List[Lesson]:
     """
     Parse a nested lesson table to extract lesson information.
     
     Each nested table represents one lesson period and contains:
     - Roman numeral in <th> (I, II, III, etc.)
-    - Subject name, room number, and teacher in <td>
+    - Subject name, room number, and teacher in <td>, one row per
+      subgroup with a "1п/гр" / "2п/гр" <td> when the pair is split
     
     Args:
         nested_table: BeautifulSoup table element
     
     Returns:
-        Dict with lesson details (never None, returns 'Пары нет' for empty lessons)
+        Lessons of the pair (never empty, 'Пары нет' for empty lessons)
     """
-    import re
-    
     # Extract lesson number from th
     th = nested_table.find('th')
     lesson_number = th.get_text(strip=True) if th else ""
     
-    # Extract full text from the table
-    full_text = nested_table.get_text(' ', strip=True)
+    texts = [td.get_text(' ', strip=True) for td in nested_table.find_all('td')]
+    return build_lessons(lesson_number, texts)
+
+
+def build_lessons(lesson_number: str, cell_texts: List[str]) -> List[Lesson]:
+    """
+    Build the lessons of one pair from the texts of a nested lesson table.
+    
+    Shared by both parser backends so they produce identical lessons.
+    A split pair has a "1п/гр" / "2п/гр" cell before the text of each
+    subgroup, every subgroup becomes a lesson of its own.
     
+    Args:
+        lesson_number: Roman numeral from the <th>
+        cell_texts: Texts of its <td> cells in document order, joined with spaces
+    
+    Returns:
+        Lessons of the pair, one per subgroup for split pairs
+        ('Пары нет' for empty lessons)
+    """
+    lessons = []
+    subgroup = 0
+    
+    for text in cell_texts:
+        if not text:
+            continue
+        
+        subgroup_match = SUBGROUP_PATTERN.search(text)
+        if subgroup_match:
+            subgroup = int(subgroup_match.group(1))
+            continue
+        
+        lessons.append(build_lesson(lesson_number, text, subgroup))
+    
+    # Nothing on the pair at all, or "нет" for every subgroup
+    if all(lesson.is_empty for lesson in lessons):
+        return [Lesson.create(lesson_number, EMPTY_SUBJECT)]
+    return lessons
+
+
+def build_lesson(lesson_number: str, text: str, subgroup: int = 0) -> Lesson:
+    """
+    Build one lesson from its "Subject (Room) Teacher" text.
+    
+    Args:
+        lesson_number: Roman numeral from the <th>
+        text: Text of the lesson cell
+        subgroup: Subgroup the lesson is for, 0 for the whole group
+    
+    Returns:
+        Lesson ('Пары нет' for empty lessons)
+    """
     # Check if this is an empty/"no lesson" entry
-    if 'нет (нет) нет' in full_text or 'нет нет нет' in full_text:
-        return {
-            "number": lesson_number,
-            "subject": "Пары нет",
-            "room": "",
-            "teacher": ""
-        }
-    
-    # Extract subject, room, teacher
-    subject = ""
-    room = ""
-    teacher = ""
+    if text.replace(' ', '') in EMPTY_ENTRIES:
+        return Lesson.create(lesson_number, EMPTY_SUBJECT, subgroup=subgroup)
+    
+    # Try to parse: Subject (Room) Teacher
+    room_match = ROOM_PATTERN.search(text)
+    if room_match:
+        room = room_match.group(1)
+        # Split by parentheses to get subject and teacher
+        parts = ROOM_SPLIT_PATTERN.split(text)
+        subject = parts[0].strip()
+        teacher = parts[1].strip() if len(parts) >= 2 else ""
+    else:
+        # No room found, might be just subject or subject+teacher
+        subject = text
+        room = ""
+        teacher = ""
+    
+    return Lesson.create(lesson_number, subject if subject else EMPTY_SUBJECT, room, teacher, subgroup)
+
+
+def _lxml_text(element, separator: str = "") -> str:
+    """Same as BeautifulSoup's get_text(separator, strip=True) for lxml elements."""
+    return separator.join(text.strip() for text in element.itertext() if text.strip())
+
+
+def parse_day_page_lxml(content) -> Optional[Dict[str, GroupDay]]:
+    """
+    Parse the day page by walking the lxml tree directly.
+    
+    Same result as the BeautifulSoup backend without building a soup.
+    
+    Args:
+        content: Raw HTML of the day page
     
-    # Find all td cells
-    tds = nested_table.find_all('td')
-    for td in tds:
-        text = td.get_text(' ', strip=True)
+    Returns:
+        Dict mapping group name to its lessons or None if the page has
+        no schedule table
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    root = lxml.html.document_fromstring(content, parser=LXML_PARSER)
+    
+    tables = BORDER_TABLE_XPATH(root)
+    if not tables:
+        return None
+    
+    schedule = {}
+    header = None
+    for row in tables[0].xpath('./tbody/tr | ./tr'):
+        cells = row.xpath('./th | ./td')
         
-        # Skip "1п/гр" and "2п/гр" cells
-        if 'п/гр' in text or not text:
+        if header is not None:
+            for column, group in header:
+                if column < len(cells):
+                    schedule[group] = GroupDay(intern_text(group), tuple(
+                        lesson
+                        for nested_table in cells[column].iterdescendants('table')
+                        for lesson in parse_nested_lesson_table_lxml(nested_table)
+                    ))
+            header = None
             continue
         
-        # Try to parse: Subject (Room) Teacher
-        room_match = re.search(r'\((.*?)\)', text)
-        if room_match:
-            room = room_match.group(1)
-            # Split by parentheses to get subject and teacher
-            parts = re.split(r'\([^)]+\)', text)
-            if len(parts) >= 1:
-                subject = parts[0].strip()
-            if len(parts) >= 2:
-                teacher = parts[1].strip()
-        else:
-            # No room found, might be just subject or subject+teacher
-            subject = text
-            teacher = ""
+        names = [(column, _lxml_text(cell)) for column, cell in enumerate(cells) if cell.tag == 'th']
+        header = [(column, group) for column, group in names if group] or None
     
-    return {
-        "number": lesson_number,
-        "subject": subject if subject else "Пары нет",
-        "room": room,
-        "teacher": teacher
-    }
+    return schedule
+
+
+def parse_nested_lesson_table_lxml(nested_table) -> List[Lesson]:
+    """
+    Parse a nested lesson table from the lxml tree.
+    
+    Args:
+        nested_table: lxml table element
+    
+    Returns:
+        Lessons of the pair, one per subgroup for split pairs
+    """
+    th = next(nested_table.iterdescendants('th'), None)
+    lesson_number = _lxml_text(th) if th is not None else ""
+    texts = [_lxml_text(td, ' ') for td in nested_table.iterdescendants('td')]
+    return build_lessons(lesson_number, texts)
 
 
 def parse_lesson_entry(text: str) -> Optional[Dict[str, str]]:
@@ -228,8 +446,6 @@ def parse_lesson_entry(text: str) -> Optional[Dict[str, str]]:
         return None
     
     # Try to extract components
-    import re
-    
     # Pattern: Roman numeral, subject, (room), teacher
     # Example: "I История (№22) Сафиюллина Г.М."
     
@@ -269,42 +485,17 @@ def parse_lesson_entry(text: str) -> Optional[Dict[str, str]]:
     }
 
 
-def format_schedule(lessons: List[Dict[str, str]], group: str, days_offset: int = 0) -> str:
+def format_schedule(lessons: Sequence[Lesson], group: str, days_offset: int = 0) -> str:
     """
     Format schedule into a readable message.
     
     Args:
-        lessons: List of lesson dictionaries
+        lessons: Lessons of the group
         group: Group name
-        days_offset: 0 for today, 1 for tomorrow
+        days_offset: Number of days from today (0 = today, 1 = tomorrow)
     
     Returns:
         Formatted schedule string
     """
-    date_str = get_date_string(days_offset)
-    day_name = "сегодня" if days_offset == 0 else "завтра"
-    
-    if not lessons:
-        return f"📅 Расписание для группы {group} на {day_name} ({date_str}):\n\n❌ Занятий нет"
-    
-    message = f"📅 Расписание для группы {group} на {day_name} ({date_str}):\n\n"
-    
-    for i, lesson in enumerate(lessons, 1):
-        number = lesson.get('number', str(i))
-        subject = lesson.get('subject', 'Не указано')
-        room = lesson.get('room', '')
-        teacher = lesson.get('teacher', '')
-        
-        if subject == "Пары нет":
-            # For empty lessons, just show the number and "Пары нет"
-            message += f"{number}. ❌ Пары нет\n\n"
-        else:
-            # For regular lessons, show full info
-            message += f"{number}. {subject}\n"
-            if room:
-                message += f"   🚪 Аудитория: {room}\n"
-            if teacher:
-                message += f"   👨‍🏫 Преподаватель: {teacher}\n"
-            message += "\n"
-    
-    return message.strip()
+    label = day_label(days_offset, day=get_target_date(days_offset))
+    return render_lessons(lessons, group, label, get_date_string(days_offset))
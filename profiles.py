@@ -0,0 +1,93 @@
+"""
+In-memory cache of user profiles.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+from database import AsyncDatabase, db
+from models import UserProfile
+
+
+class ProfileCache:
+    """
+    Write-through LRU cache of user profiles in front of the database.
+    
+    A profile is loaded with one query on first use and then served from
+    memory for ttl seconds. Writes go to the database first, then the
+    committed row is read back into the cache. The least recently used
+    profiles are dropped once max_size is reached.
+    
+    Every process has its own cache, so a change made through another
+    process shows here after at most ttl seconds. Read-modify-write
+    updates such as toggles read the row with fresh=True instead.
+    """
+    
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        max_size: int = PROFILE_CACHE_SIZE,
+        ttl: float = PROFILE_CACHE_TTL
+    ):
+        self.database = database
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (profile, monotonic time it was read)
+        self._profiles: "OrderedDict[int, Tuple[UserProfile, float]]" = OrderedDict()
+    
+    async def get(self, user_id: int, fresh: bool = False) -> UserProfile:
+        """
+        Get a user's profile, defaults for users without stored settings.
+        
+        Args:
+            user_id: Telegram user id
+            fresh: Read the database even if a cached copy is valid
+        """
+        entry = self._profiles.get(user_id)
+        if not fresh and entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self._profiles.move_to_end(user_id)
+            return entry[0]
+        
+        return await self._reload(user_id)
+    
+    async def set_default_group(self, user_id: int, group: str) -> UserProfile:
+        """Store a user's default group and return the updated profile."""
+        await self.database.set_default_group(user_id, group)
+        return await self._reload(user_id)
+    
+    async def set_notifications(self, user_id: int, enabled: bool) -> UserProfile:
+        """Store a user's notification flag and return the updated profile."""
+        await self.database.set_notifications(user_id, enabled)
+        return await self._reload(user_id)
+    
+    async def set_subgroup(self, user_id: int, subgroup: int) -> UserProfile:
+        """Store a user's subgroup and return the updated profile."""
+        await self.database.set_subgroup(user_id, subgroup)
+        return await self._reload(user_id)
+    
+    async def set_reminders(self, user_id: int, enabled: bool) -> UserProfile:
+        """Store a user's pair reminder flag and return the updated profile."""
+        await self.database.set_reminders(user_id, enabled)
+        return await self._reload(user_id)
+    
+    def invalidate(self, user_id: int):
+        """Drop a cached profile, e.g. after it was changed elsewhere."""
+        self._profiles.pop(user_id, None)
+    
+    async def _reload(self, user_id: int) -> UserProfile:
+        # The row as committed, with changes made by other processes
+        profile = await self.database.get_user_profile(user_id)
+        self._put(profile)
+        return profile
+    
+    def _put(self, profile: UserProfile):
+        self._profiles[profile.user_id] = (profile, time.monotonic())
+        self._profiles.move_to_end(profile.user_id)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+
+# Shared profile cache used by handlers
+profiles = ProfileCache(db)
@@ -0,0 +1,149 @@
+"""
+Reminders sent a few minutes before each pair to the users who opted in.
+"""
+
+import heapq
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from broadcaster import Broadcaster
+from config import BELLS_SHIFT_1, BELLS_SHIFT_2, REMINDER_MINUTES
+from database import AsyncDatabase
+from models import DaySchedule
+from renderer import render_reminder
+from schedule_cache import ScheduleCache, schedule_cache
+
+
+def parse_bells(times: Sequence[str]) -> Tuple[time, ...]:
+    """Bell times from "HH:MM" strings, the first one is pair I."""
+    return tuple(time.fromisoformat(value.strip()) for value in times)
+
+
+# Start of each pair per shift, BELLS[shift][pair - 1]
+BELLS: Dict[int, Tuple[time, ...]] = {
+    1: parse_bells(BELLS_SHIFT_1),
+    2: parse_bells(BELLS_SHIFT_2),
+}
+
+
+def pair_start(shift: int, pair: int) -> Optional[time]:
+    """Bell time of a pair, None for a pair outside the bell table."""
+    bells = BELLS.get(shift, BELLS[1])
+    return bells[pair - 1] if 1 <= pair <= len(bells) else None
+
+
+class ReminderQueue:
+    """
+    Reminders of one day as a min-heap of (send time, group, pair).
+    
+    Built from the day page: one entry per pair each group has, whether or
+    not anyone wants it. Taking the due entries pops only those, so a
+    minute without a starting pair costs one look at the top.
+    """
+    
+    def __init__(self, day_schedule: DaySchedule, minutes: int = REMINDER_MINUTES):
+        self.date = day_schedule.date
+        self.content_hash = day_schedule.content_hash()
+        self.minutes = minutes
+        self._heap: List[Tuple[datetime, str, int]] = []
+        
+        lead = timedelta(minutes=minutes)
+        for group, group_day in day_schedule.groups.items():
+            for pair in {lesson.number for lesson in group_day if not lesson.is_empty}:
+                starts_at = pair_start(day_schedule.shift, pair)
+                if starts_at is not None:
+                    self._heap.append((datetime.combine(self.date, starts_at) - lead, group, pair))
+        heapq.heapify(self._heap)
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+    
+    def due(self, now: datetime) -> List[Tuple[str, int]]:
+        """
+        Take the reminders to send at now.
+        
+        Entries whose pair already started are dropped without being
+        returned, e.g. after the bot was down.
+        
+        Returns:
+            (group, pair) of every reminder due
+        """
+        lead = timedelta(minutes=self.minutes)
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            send_at, group, pair = heapq.heappop(self._heap)
+            if send_at + lead > now:
+                due.append((group, pair))
+        return due
+
+
+class ReminderEngine:
+    """
+    Per-minute dispatcher of pair reminders.
+    
+    The queue of the day is built from the cached schedule and rebuilt
+    when the day or its lessons change. Each tick sends the due reminders
+    to the group's users with reminders on, read from their own index, so
+    the cost of a tick follows the groups starting a pair, not the number
+    of users.
+    """
+    
+    def __init__(
+        self,
+        bot,
+        database: AsyncDatabase,
+        cache: ScheduleCache = schedule_cache,
+        minutes: int = REMINDER_MINUTES
+    ):
+        self.bot = bot
+        self.database = database
+        self.cache = cache
+        self.minutes = minutes
+        self._queue: Optional[ReminderQueue] = None
+        # (group, pair) already sent today, kept across rebuilds
+        self._sent: Set[Tuple[str, int]] = set()
+        self._sent_date: Optional[date] = None
+    
+    async def tick(self, now: Optional[datetime] = None):
+        """Send the reminders due at now, called once a minute."""
+        now = now or datetime.now()
+        # Only the cached copy, a tick never waits for the site
+        day_schedule = await self.cache.get_cached_day(now.date())
+        if day_schedule is None:
+            return
+        
+        queue = self._queue
+        if queue is None or queue.date != day_schedule.date or queue.content_hash != day_schedule.content_hash():
+            queue = self._queue = ReminderQueue(day_schedule, self.minutes)
+        if self._sent_date != now.date():
+            self._sent.clear()
+            self._sent_date = now.date()
+        
+        due = [entry for entry in queue.due(now) if entry not in self._sent]
+        if not due:
+            return
+        self._sent.update(due)
+        
+        report = await Broadcaster(self.bot).send(self._messages(day_schedule, due))
+        sent = sum(stats["sent"] for stats in report.values())
+        print(f"[{now:%H:%M}] Reminders for {len(due)} pairs, sent {sent}")
+    
+    async def _messages(self, day_schedule: DaySchedule, due: List[Tuple[str, int]]):
+        for group, pair in due:
+            lessons = [
+                lesson for lesson in day_schedule.lessons(group)
+                if lesson.number == pair and not lesson.is_empty
+            ]
+            starts_at = pair_start(day_schedule.shift, pair)
+            # One text per subgroup, None when the subgroup has no lesson
+            texts: Dict[int, Optional[str]] = {}
+            
+            async for chunk in self.database.iter_group_subscribers(group, reminders=True):
+                for user_id, subgroup in chunk:
+                    if subgroup not in texts:
+                        own = [lesson for lesson in lessons if lesson.applies_to(subgroup)]
+                        texts[subgroup] = (
+                            render_reminder(own, group, starts_at, self.minutes) if own else None
+                        )
+                    if texts[subgroup] is not None:
+                        yield user_id, texts[subgroup], group
@@ -0,0 +1,384 @@
+"""
+Rendering of schedule messages with an in-memory cache of the results.
+"""
+
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from lookup import LessonEntry
+from models import DaySchedule, GroupDay, Lesson, ROMAN_NUMERALS
+
+
+DEFAULT_LOCALE = "ru"
+
+# Message texts per locale
+TEXTS = {
+    "ru": {
+        "title": "📅 Расписание для группы {group} на {label} ({date}):",
+        "no_lessons": "❌ Занятий нет",
+        "empty_lesson": "{number}. ❌ Пары нет",
+        "subgroup": "{text} ({subgroup} п/гр)",
+        "room": "   🚪 Аудитория: {room}",
+        "teacher": "   👨‍🏫 Преподаватель: {teacher}",
+        "teacher_title": "👨‍🏫 {teacher} на {label} ({date}):",
+        "room_title": "🚪 Аудитория {room} на {label} ({date}):",
+        "entry": "{number}. {group} — {subject}",
+        "free_title": "🆓 Свободные аудитории на {label} ({date}), {pairs}:",
+        "free_none": "❌ Свободных аудиторий нет",
+        "pair": "пара {numerals}",
+        "pairs": "пары {numerals}",
+        "unavailable": "❌ Не удалось загрузить расписание на {label} ({date})",
+        "reminder": "⏰ Через {minutes} мин. {numeral} пара ({time}), группа {group}:",
+        "today": "сегодня",
+        "tomorrow": "завтра",
+        # Day names after "на", Monday first
+        "weekdays": ("понедельник", "вторник", "среду", "четверг", "пятницу", "субботу", "воскресенье"),
+    },
+}
+
+# Telegram's limit on the length of a message
+MESSAGE_LIMIT = 4096
+
+# Characters with a meaning in Telegram's legacy Markdown
+MARKDOWN_SPECIAL = str.maketrans({char: "\\" + char for char in "_*`["})
+
+# (group, subgroup, date, label, parse mode, locale)
+RenderKey = Tuple[str, int, date, str, Optional[str], str]
+
+
+def escape(text: str, parse_mode: Optional[str]) -> str:
+    """Escape text taken from the site for the given parse mode."""
+    if parse_mode == "Markdown":
+        return text.translate(MARKDOWN_SPECIAL)
+    return text
+
+
+def day_label(days_offset: int, locale: str = DEFAULT_LOCALE, day: Optional[date] = None) -> str:
+    """
+    Name of the day in the message title.
+    
+    Today and tomorrow are named as such, later dates by their weekday.
+    
+    Args:
+        days_offset: Offset of the day from today
+        locale: Key of TEXTS
+        day: The date itself, needed for offsets above 1
+    """
+    texts = TEXTS[locale]
+    if days_offset == 0:
+        return texts["today"]
+    if days_offset == 1 or day is None:
+        return texts["tomorrow"]
+    return texts["weekdays"][day.weekday()]
+
+
+def with_subgroup(text: str, subgroup: int, locale: str = DEFAULT_LOCALE) -> str:
+    """Add the subgroup tag to a text, unchanged for subgroup 0."""
+    if not subgroup:
+        return text
+    return TEXTS[locale]["subgroup"].format(text=text, subgroup=subgroup)
+
+
+def split_messages(blocks: Iterable[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Join text blocks into as few messages as fit Telegram's length limit.
+    
+    Blocks are never cut, a block longer than the limit becomes a message
+    of its own.
+    """
+    messages = []
+    current: List[str] = []
+    length = 0
+    for block in blocks:
+        added = len(block) + (2 if current else 0)
+        if current and length + added > limit:
+            messages.append("\n\n".join(current))
+            current, length = [], 0
+            added = len(block)
+        current.append(block)
+        length += added
+    if current:
+        messages.append("\n\n".join(current))
+    return messages
+
+
+def render_lessons(
+    lessons: Sequence[Lesson],
+    group: str,
+    label: str,
+    date_str: str,
+    parse_mode: Optional[str] = None,
+    locale: str = DEFAULT_LOCALE,
+    subgroup: int = 0
+) -> str:
+    """
+    Build the schedule message of a group.
+    
+    Lessons of split pairs are tagged with their subgroup.
+    
+    Args:
+        lessons: Lessons of the group
+        group: Group name
+        label: Day name shown in the title
+        date_str: Date shown in the title (DD/MM/YYYY)
+        parse_mode: Telegram parse mode the message will be sent with
+        locale: Key of TEXTS
+        subgroup: Subgroup the lessons were chosen for, shown in the title
+    
+    Returns:
+        Formatted schedule string
+    """
+    texts = TEXTS[locale]
+    title = texts["title"].format(
+        group=with_subgroup(escape(group, parse_mode), subgroup, locale), label=label, date=date_str
+    )
+    
+    if not lessons:
+        return f"{title}\n\n{texts['no_lessons']}"
+    
+    return "\n\n".join([title] + [render_lesson(lesson, parse_mode, locale) for lesson in lessons])
+
+
+def render_lesson(lesson: Lesson, parse_mode: Optional[str] = None, locale: str = DEFAULT_LOCALE) -> str:
+    """Build the block of one lesson: number and subject, room, teacher."""
+    texts = TEXTS[locale]
+    if lesson.is_empty:
+        # For empty lessons, just show the number and "Пары нет"
+        return with_subgroup(texts["empty_lesson"].format(number=lesson.numeral), lesson.subgroup, locale)
+    
+    lines = [with_subgroup(f"{lesson.numeral}. {escape(lesson.subject, parse_mode)}", lesson.subgroup, locale)]
+    if lesson.room:
+        lines.append(texts["room"].format(room=escape(lesson.room, parse_mode)))
+    if lesson.teacher:
+        lines.append(texts["teacher"].format(teacher=escape(lesson.teacher, parse_mode)))
+    return "\n".join(lines)
+
+
+def render_reminder(
+    lessons: Sequence[Lesson],
+    group: str,
+    starts_at: time,
+    minutes: int,
+    locale: str = DEFAULT_LOCALE
+) -> str:
+    """
+    Build the reminder sent before a pair.
+    
+    Args:
+        lessons: Lessons of the pair, one per subgroup for split pairs
+        group: Group name
+        starts_at: Bell time of the pair
+        minutes: Minutes left until the pair starts
+        locale: Key of TEXTS
+    
+    Returns:
+        Formatted reminder
+    """
+    title = TEXTS[locale]["reminder"].format(
+        minutes=minutes, numeral=lessons[0].numeral, time=starts_at.strftime("%H:%M"), group=group
+    )
+    return "\n\n".join([title] + [render_lesson(lesson, locale=locale) for lesson in lessons])
+
+
+def render_entries(
+    entries: Sequence[LessonEntry],
+    title: str,
+    detail: str,
+    parse_mode: Optional[str] = None,
+    locale: str = DEFAULT_LOCALE
+) -> str:
+    """
+    Build the message of a teacher or room lookup.
+    
+    Args:
+        entries: Lessons found, in pair order
+        title: First line of the message
+        detail: "room" to show the room of each lesson, "teacher" for the
+            teacher
+        parse_mode: Telegram parse mode the message will be sent with
+        locale: Key of TEXTS
+    
+    Returns:
+        Formatted lookup result
+    """
+    texts = TEXTS[locale]
+    if not entries:
+        return f"{title}\n\n{texts['no_lessons']}"
+    
+    blocks = [title]
+    for entry in entries:
+        lesson = entry.lesson
+        lines = [texts["entry"].format(
+            number=lesson.numeral,
+            group=with_subgroup(escape(entry.group, parse_mode), lesson.subgroup, locale),
+            subject=escape(lesson.subject, parse_mode)
+        )]
+        value = getattr(lesson, detail).strip()
+        if value:
+            lines.append(texts[detail].format(**{detail: escape(value, parse_mode)}))
+        blocks.append("\n".join(lines))
+    
+    return "\n\n".join(blocks)
+
+
+def render_teacher_day(
+    teacher: str,
+    entries: Sequence[LessonEntry],
+    day: date,
+    days_offset: int,
+    locale: str = DEFAULT_LOCALE
+) -> str:
+    """Build the message with a teacher's lessons on a day."""
+    title = TEXTS[locale]["teacher_title"].format(
+        teacher=teacher, label=day_label(days_offset, locale, day), date=day.strftime("%d/%m/%Y")
+    )
+    return render_entries(entries, title, "room", locale=locale)
+
+
+def render_room_day(
+    room: str,
+    entries: Sequence[LessonEntry],
+    day: date,
+    days_offset: int,
+    locale: str = DEFAULT_LOCALE
+) -> str:
+    """Build the message with the lessons held in a room on a day."""
+    title = TEXTS[locale]["room_title"].format(
+        room=room, label=day_label(days_offset, locale, day), date=day.strftime("%d/%m/%Y")
+    )
+    return render_entries(entries, title, "teacher", locale=locale)
+
+
+def render_free_rooms(
+    rooms: Sequence[str],
+    pairs: Sequence[int],
+    day: date,
+    days_offset: int,
+    locale: str = DEFAULT_LOCALE
+) -> str:
+    """Build the message with the rooms free during the given pairs."""
+    texts = TEXTS[locale]
+    numerals = ", ".join(ROMAN_NUMERALS[pair] for pair in pairs)
+    title = texts["free_title"].format(
+        label=day_label(days_offset, locale, day),
+        date=day.strftime("%d/%m/%Y"),
+        pairs=texts["pair" if len(pairs) == 1 else "pairs"].format(numerals=numerals)
+    )
+    if not rooms:
+        return f"{title}\n\n{texts['free_none']}"
+    return f"{title}\n\n" + ", ".join(rooms)
+
+
+class MessageRenderer:
+    """
+    Cache of rendered schedule messages.
+    
+    Each (group, subgroup, date, label, parse mode, locale) variant is rendered once
+    and then served from memory. An entry remembers the content hash of the
+    group's lessons it was rendered from and is rebuilt when a reload of the
+    day brings different lessons. Entries of past dates are dropped.
+    """
+    
+    def __init__(self):
+        self._entries: Dict[RenderKey, Tuple[GroupDay, str, str]] = {}
+        self._today: Optional[date] = None
+    
+    def render(
+        self,
+        day_schedule: DaySchedule,
+        group: str,
+        days_offset: int = 0,
+        parse_mode: Optional[str] = None,
+        locale: str = DEFAULT_LOCALE,
+        subgroup: int = 0
+    ) -> str:
+        """
+        Get the schedule message of a group on a day.
+        
+        Args:
+            day_schedule: Schedule of the day
+            group: Group name
+            days_offset: Offset of the day from today, selects the label
+            parse_mode: Telegram parse mode the message will be sent with
+            locale: Key of TEXTS
+            subgroup: Show only the lessons of this subgroup, 0 for all
+        
+        Returns:
+            Formatted schedule string
+        """
+        label = day_label(days_offset, locale, day_schedule.date)
+        key = (group, subgroup, day_schedule.date, label, parse_mode, locale)
+        group_day = day_schedule.get(group) or GroupDay(group)
+        
+        entry = self._entries.get(key)
+        if entry is not None:
+            rendered_from, content_hash, text = entry
+            # Same object: the day was not reloaded since the last render
+            if rendered_from is group_day:
+                return text
+            if content_hash == group_day.content_hash():
+                self._entries[key] = (group_day, content_hash, text)
+                return text
+        
+        text = render_lessons(
+            group_day.for_subgroup(subgroup), group, label,
+            day_schedule.date.strftime("%d/%m/%Y"), parse_mode, locale, subgroup
+        )
+        self._evict_past()
+        self._entries[key] = (group_day, group_day.content_hash(), text)
+        return text
+    
+    def render_week(
+        self,
+        day_schedules: Dict[date, Optional[DaySchedule]],
+        group: str,
+        parse_mode: Optional[str] = None,
+        locale: str = DEFAULT_LOCALE,
+        subgroup: int = 0
+    ) -> List[str]:
+        """
+        Get the schedule messages of a group for several dates.
+        
+        Every date is rendered (or served from the cache) on its own, the
+        results are joined into as few messages as Telegram allows.
+        
+        Args:
+            day_schedules: Schedule per date, None for dates that could not
+                be loaded
+            group: Group name
+            parse_mode: Telegram parse mode the messages will be sent with
+            locale: Key of TEXTS
+            subgroup: Show only the lessons of this subgroup, 0 for all
+        
+        Returns:
+            Messages to send in order
+        """
+        today = date.today()
+        blocks = []
+        for day, day_schedule in day_schedules.items():
+            days_offset = (day - today).days
+            if day_schedule is None:
+                blocks.append(TEXTS[locale]["unavailable"].format(
+                    label=day_label(days_offset, locale, day), date=day.strftime("%d/%m/%Y")
+                ))
+            else:
+                blocks.append(self.render(day_schedule, group, days_offset, parse_mode, locale, subgroup))
+        return split_messages(blocks)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _evict_past(self):
+        today = date.today()
+        if today == self._today:
+            return
+        self._today = today
+        for key in [key for key in self._entries if key[2] < today]:
+            del self._entries[key]
+
+
+# Shared renderer used by handlers and the scheduler
+message_renderer = MessageRenderer()
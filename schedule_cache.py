@@ -0,0 +1,293 @@
+"""
+In-memory cache of parsed day schedules.
+"""
+
+import asyncio
+import time
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import FETCH_SESSIONS, SCHEDULE_CACHE_TTL
+from fetcher import schedule_fetcher
+from models import DaySchedule, Lesson
+from parser import fetch_day_schedule_async, get_target_date
+from state import StateBackend, state_backend
+
+
+ChangeListener = Callable[[DaySchedule, DaySchedule], Awaitable[None]]
+LoadListener = Callable[[DaySchedule], Awaitable[None]]
+
+# Most dates get_days loads in one call, a week of school days
+MAX_BATCH_DAYS = 7
+
+
+async def load_day_schedule(day: date) -> Optional[DaySchedule]:
+    """Load a day schedule from the site with the shared fetcher."""
+    return await fetch_day_schedule_async(day, schedule_fetcher)
+
+
+class ScheduleCache:
+    """
+    Date-keyed cache of day schedules.
+    
+    Fresh entries are served from memory. Expired entries are still served
+    while a refresh runs in the background, so a slow site never delays a
+    reply once the day has been loaded. Concurrent misses for the same date
+    share a single in-flight load.
+    
+    With a store, every loaded day is also saved as a snapshot in the
+    shared state backend, and days missing from memory are read from the
+    snapshot before going to the site, so the bot keeps answering while
+    the site is down. Before reloading a day, a fresh snapshot saved by
+    another process is taken instead, so processes sharing the store load
+    each day from the site about once per TTL between them.
+    
+    Listeners are called with the previous and the new version whenever a
+    load from the site returns different content for a date already known.
+    Load listeners are called with every day loaded from the site.
+    """
+    
+    def __init__(
+        self,
+        loader: Callable[[date], Awaitable[Optional[DaySchedule]]] = load_day_schedule,
+        ttl: float = SCHEDULE_CACHE_TTL,
+        store: Optional[StateBackend] = None
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.store = store
+        self._entries: Dict[date, Tuple[DaySchedule, float]] = {}
+        self._inflight: Dict[date, asyncio.Task] = {}
+        self._listeners: List[ChangeListener] = []
+        self._load_listeners: List[LoadListener] = []
+        self._listener_tasks: Set[asyncio.Task] = set()
+    
+    async def get_day(self, day: date) -> Optional[DaySchedule]:
+        """
+        Get the schedule of all groups for a date.
+        
+        Args:
+            day: Date to get
+        
+        Returns:
+            Schedule of all groups or None if the day is not cached and
+            could not be loaded
+        """
+        entry = self._entries.get(day)
+        if entry is None:
+            entry = await self._load_snapshot(day)
+        
+        if entry is not None:
+            day_schedule, loaded_at = entry
+            if time.time() - loaded_at >= self.ttl:
+                # Serve the stale copy, refresh in the background
+                self.refresh(day)
+            return day_schedule
+        
+        # Waiters are shielded so a cancelled request doesn't cancel the shared load
+        return await asyncio.shield(self.refresh(day))
+    
+    async def get_cached_day(self, day: date) -> Optional[DaySchedule]:
+        """
+        Get a date from memory or the stored snapshot, never from the site.
+        
+        Stale copies are returned as they are and no refresh is started,
+        for answers that must not wait for the site.
+        
+        Returns:
+            Schedule of all groups or None if the day was not loaded yet
+        """
+        entry = self._entries.get(day)
+        if entry is None:
+            entry = await self._load_snapshot(day)
+        return entry[0] if entry is not None else None
+    
+    async def get_days(
+        self,
+        days: Sequence[date],
+        concurrency: int = FETCH_SESSIONS
+    ) -> Dict[date, Optional[DaySchedule]]:
+        """
+        Get the schedules of several dates at once.
+        
+        Dates missing from the cache are loaded concurrently, at most
+        concurrency at a time, so a week costs about one page load instead
+        of one per day. Each load is bound to its own date in the fetcher.
+        
+        Args:
+            days: Dates to get, at most MAX_BATCH_DAYS
+            concurrency: Maximum number of dates loaded in parallel
+        
+        Returns:
+            Schedule per date in the given order, None for dates that could
+            not be loaded
+        """
+        if len(days) > MAX_BATCH_DAYS:
+            raise ValueError(f"At most {MAX_BATCH_DAYS} dates per batch, got {len(days)}")
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def get_one(day: date) -> Optional[DaySchedule]:
+            async with semaphore:
+                return await self.get_day(day)
+        
+        schedules = await asyncio.gather(*(get_one(day) for day in days))
+        return dict(zip(days, schedules))
+    
+    async def get_lessons(self, group: str, days_offset: int = 0) -> Optional[Tuple[Lesson, ...]]:
+        """
+        Get lessons of a group.
+        
+        Args:
+            group: Group name (e.g., "ИС-1-24")
+            days_offset: Number of days from today (0 = today, 1 = tomorrow)
+        
+        Returns:
+            List of lessons or None if the schedule is unavailable
+        """
+        day_schedule = await self.get_day(get_target_date(days_offset))
+        if day_schedule is None:
+            return None
+        return day_schedule.lessons(group)
+    
+    def refresh(self, day: date) -> asyncio.Task:
+        """
+        Start loading a date unless a load is already in flight.
+        
+        Returns:
+            Task resolving to the loaded (or previously cached) schedule
+        """
+        task = self._inflight.get(day)
+        if task is None:
+            task = asyncio.create_task(self._load(day))
+            self._inflight[day] = task
+            task.add_done_callback(lambda _: self._inflight.pop(day, None))
+        return task
+    
+    def add_listener(self, listener: ChangeListener):
+        """Call listener(previous, current) when a known day changes on the site."""
+        self._listeners.append(listener)
+    
+    def add_load_listener(self, listener: LoadListener):
+        """Call listener(day_schedule) whenever a day is loaded from the site."""
+        self._load_listeners.append(listener)
+    
+    def age(self, day: date) -> Optional[float]:
+        """Seconds since a cached date was loaded, None if not cached."""
+        entry = self._entries.get(day)
+        return time.time() - entry[1] if entry is not None else None
+    
+    def freshness(self) -> Dict[date, float]:
+        """Seconds since each cached date was loaded."""
+        now = time.time()
+        return {day: now - loaded_at for day, (_, loaded_at) in sorted(self._entries.items())}
+    
+    def invalidate(self, day: Optional[date] = None):
+        """Drop one date, or every date if none is given."""
+        if day is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(day, None)
+    
+    async def _load(self, day: date) -> Optional[DaySchedule]:
+        shared = await self._load_shared(day)
+        if shared is not None:
+            return shared
+        
+        try:
+            day_schedule = await self.loader(day)
+        except Exception as e:
+            print(f"Error loading schedule for {day}: {e}")
+            day_schedule = None
+        
+        previous = self._entries.get(day) or await self._load_snapshot(day)
+        if day_schedule is None:
+            # Keep serving the previous copy if there is one
+            return previous[0] if previous else None
+        
+        if previous is not None and self._changed(previous[0], day_schedule):
+            self._notify_listeners(self._listeners, previous[0], day_schedule)
+        self._notify_listeners(self._load_listeners, day_schedule)
+        
+        loaded_at = time.time()
+        self._entries[day] = (day_schedule, loaded_at)
+        self._evict_past()
+        
+        if self.store is not None:
+            try:
+                await self.store.save_schedule_day(day_schedule, loaded_at)
+            except Exception as e:
+                print(f"Error saving schedule snapshot for {day}: {e}")
+        
+        return day_schedule
+    
+    @staticmethod
+    def _changed(previous: DaySchedule, current: DaySchedule) -> bool:
+        """Whether the lessons of a day changed on the site."""
+        if previous.parser_version != current.parser_version:
+            # Parsed differently, e.g. a snapshot from before a parser
+            # update; the differences are not edits on the site
+            print(
+                f"Schedule for {current.date} reparsed with parser version "
+                f"{current.parser_version} (was {previous.parser_version}), changes not reported"
+            )
+            return False
+        return previous.content_hash() != current.content_hash()
+    
+    def _notify_listeners(self, listeners: list, *versions: DaySchedule):
+        for listener in listeners:
+            task = asyncio.create_task(self._run_listener(listener, *versions))
+            self._listener_tasks.add(task)
+            task.add_done_callback(self._listener_tasks.discard)
+    
+    async def _run_listener(self, listener, *versions: DaySchedule):
+        try:
+            await listener(*versions)
+        except Exception as e:
+            print(f"Error handling schedule update for {versions[-1].date}: {e}")
+    
+    async def _load_snapshot(self, day: date) -> Optional[Tuple[DaySchedule, float]]:
+        snapshot = await self._read_snapshot(day)
+        if snapshot is not None:
+            self._entries[day] = snapshot
+        return snapshot
+    
+    async def _load_shared(self, day: date) -> Optional[DaySchedule]:
+        """
+        Take a fresh snapshot another process saved after our last load.
+        
+        Change listeners are called as for a load from the site, the other
+        process may not be the one that sends notifications.
+        """
+        snapshot = await self._read_snapshot(day)
+        if snapshot is None or time.time() - snapshot[1] >= self.ttl:
+            return None
+        
+        previous = self._entries.get(day)
+        if previous is not None:
+            if snapshot[1] <= previous[1]:
+                return None
+            if self._changed(previous[0], snapshot[0]):
+                self._notify_listeners(self._listeners, previous[0], snapshot[0])
+        
+        self._entries[day] = snapshot
+        return snapshot[0]
+    
+    async def _read_snapshot(self, day: date) -> Optional[Tuple[DaySchedule, float]]:
+        if self.store is None:
+            return None
+        
+        try:
+            return await self.store.get_schedule_day(day)
+        except Exception as e:
+            print(f"Error reading schedule snapshot for {day}: {e}")
+            return None
+    
+    def _evict_past(self):
+        today = get_target_date(0)
+        for day in [d for d in self._entries if d < today]:
+            del self._entries[day]
+
+
+# Shared cache used by handlers and the scheduler
+schedule_cache = ScheduleCache(store=state_backend)
@@ -2,59 +2,250 @@
 Scheduler for automated notifications.
 """
 
+import asyncio
+import functools
+import time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime
-from parser import fetch_schedule, format_schedule
-from database import Database
+from broadcaster import Broadcaster
+from changes import detect_changes, diff_group_day
+from config import CHANGE_POLL_MINUTES, PREFETCH_DAYS, PREFETCH_JITTER, PREFETCH_TIMES
+from models import DaySchedule
+from parser import get_school_days, get_target_date
+from reminders import ReminderEngine
+from renderer import escape, message_renderer
+from schedule_cache import schedule_cache
+from database import AsyncDatabase
+from state import LeaderLock
 
 
-async def send_daily_schedule(bot, db: Database):
+# Hour of the daily notification with tomorrow's schedule
+DAILY_NOTIFICATION_HOUR = 18
+
+
+async def send_daily_schedule(bot, db: AsyncDatabase):
     """
     Send tomorrow's schedule to all users with notifications enabled.
     Runs daily at 18:00.
+    
+    Each group's message is built once, its subscribers are then read from
+    the group index in chunks while the previous chunk is being sent.
     """
     print(f"[{datetime.now()}] Starting daily schedule notification...")
     
-    # Get all users who want notifications
-    users = db.get_all_users_with_notifications()
+    # Subscriber counts per group, kept up to date by triggers
+    subscribers = await db.get_subscriber_counts()
+    
+    if not subscribers:
+        print("No subscribers, notifications skipped")
+        return
     
-    sent_count = 0
-    error_count = 0
+    # Fetch tomorrow's page once, it holds the schedule of every group
+    day_schedule = await schedule_cache.get_day(get_target_date(1))
+    if day_schedule is None:
+        print("Failed to fetch tomorrow's schedule, notifications skipped")
+        return
     
-    for user_id, group in users:
-        try:
-            # Fetch tomorrow's schedule
-            lessons = fetch_schedule(group, days_offset=1)
+    format_seconds = {}
+    
+    async def build_messages():
+        for group in subscribers:
+            started = time.monotonic()
+            # One message per subgroup present among the group's subscribers
+            messages = {}
+            
+            def message_for(subgroup: int) -> str:
+                message = messages.get(subgroup)
+                if message is None:
+                    schedule_text = message_renderer.render(
+                        day_schedule, group, days_offset=1, parse_mode="Markdown", subgroup=subgroup
+                    )
+                    message = messages[subgroup] = f"🔔 **Расписание на завтра**\n\n{schedule_text}"
+                return message
             
-            if lessons is not None:
-                # Format the schedule
-                schedule_text = format_schedule(lessons, group, days_offset=1)
-                
-                # Add header
-                message = f"🔔 **Расписание на завтра**\n\n{schedule_text}"
-                
-                # Send to user
-                await bot.send_message(user_id, message, parse_mode="Markdown")
-                sent_count += 1
+            message_for(0)
+            format_seconds[group] = time.monotonic() - started
             
-        except Exception as e:
-            print(f"Error sending to user {user_id}: {e}")
-            error_count += 1
+            async for chunk in db.iter_group_subscribers(group):
+                for user_id, subgroup in chunk:
+                    yield user_id, message_for(subgroup), group
+    
+    report = await Broadcaster(bot).send(build_messages(), parse_mode="Markdown")
     
+    for group, stats in report.items():
+        print(
+            f"  {group}: {subscribers[group]} users, sent {stats['sent']}, "
+            f"blocked {stats['blocked']}, errors {stats['errors']}, "
+            f"format {format_seconds[group] * 1000:.1f} ms, done after {stats['seconds']:.1f} s"
+        )
+    
+    sent_count = sum(stats["sent"] for stats in report.values())
+    error_count = sum(stats["blocked"] + stats["errors"] for stats in report.values())
     print(f"Notifications sent: {sent_count}, errors: {error_count}")
 
 
-def setup_scheduler(bot, db: Database):
+async def prefetch_schedule(days: int = PREFETCH_DAYS, retries: int = 3, backoff: float = 30):
+    """
+    Load today and the next school days into the schedule cache.
+    
+    Runs a few times a day so user requests and the 18:00 notification
+    are served from cache. Failed days are retried with exponential backoff.
+    
+    Args:
+        days: Number of school days to load, starting today
+        retries: Attempts per day after the first one
+        backoff: Delay before the first retry in seconds, doubled each time
+    """
+    print(f"[{datetime.now()}] Prefetching schedule for {days} days...")
+    
+    for day in get_school_days(days):
+        for attempt in range(retries + 1):
+            await schedule_cache.refresh(day)
+            age = schedule_cache.age(day)
+            if age is not None and age < schedule_cache.ttl:
+                break
+            if attempt < retries:
+                delay = backoff * 2 ** attempt
+                print(f"Prefetch of {day} failed, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+        else:
+            print(f"Prefetch of {day} failed, the cache keeps the previous copy")
+    
+    freshness = ", ".join(
+        f"{day:%d.%m} {age / 60:.0f} min" for day, age in schedule_cache.freshness().items()
+    )
+    print(f"Schedule freshness: {freshness}")
+
+
+async def notify_schedule_changes(bot, db: AsyncDatabase, previous: DaySchedule, current: DaySchedule):
     """
-    Setup the scheduler for daily notifications.
+    Send what changed to subscribers of the changed groups.
+    
+    Today's changes are always sent. Tomorrow's are sent only after the
+    daily notification went out, before that it already has them.
+    """
+    today = get_target_date(0)
+    if current.date == today:
+        day_name = "сегодня"
+    elif current.date == get_target_date(1) and datetime.now().hour >= DAILY_NOTIFICATION_HOUR:
+        day_name = "завтра"
+    else:
+        return
+    
+    # Subjects, rooms and teachers come from the site and may contain * or _
+    changes = detect_changes(previous, current, parse_mode="Markdown")
+    if not changes:
+        return
+    
+    print(f"[{datetime.now()}] Schedule for {current.date} changed in {len(changes)} groups")
+    
+    async def build_messages():
+        for group, lines in changes.items():
+            # One message per subgroup, None when its own lessons did not change
+            messages = {}
+            
+            def message_for(subgroup: int):
+                if subgroup not in messages:
+                    own_lines = lines if not subgroup else diff_group_day(
+                        previous.get(group), current.get(group), subgroup, parse_mode="Markdown"
+                    )
+                    messages[subgroup] = (
+                        f"✏️ **Изменения в расписании на {day_name}** ({current.date:%d/%m/%Y})\n"
+                        f"Группа {escape(group, 'Markdown')}\n\n" + "\n".join(own_lines)
+                    ) if own_lines else None
+                return messages[subgroup]
+            
+            async for chunk in db.iter_group_subscribers(group):
+                for user_id, subgroup in chunk:
+                    message = message_for(subgroup)
+                    if message is not None:
+                        yield user_id, message, group
+    
+    report = await Broadcaster(bot).send(build_messages(), parse_mode="Markdown")
+    for group, stats in report.items():
+        print(f"  {group}: change sent {stats['sent']}, errors {stats['blocked'] + stats['errors']}")
+
+
+async def poll_schedule_changes():
+    """
+    Reload today and tomorrow from the site.
+    
+    One fetch per date; changed groups are reported to the cache listeners.
+    """
+    for days_offset in (0, 1):
+        await schedule_cache.refresh(get_target_date(days_offset))
+
+
+def leader_only(leader: LeaderLock, job):
+    """Wrap a job so it only runs in the process holding the leader lock."""
+    @functools.wraps(job)
+    async def run(*args, **kwargs):
+        if leader.is_leader:
+            return await job(*args, **kwargs)
+    return run
+
+
+def setup_scheduler(bot, db: AsyncDatabase, leader: LeaderLock):
+    """
+    Setup the scheduler for daily notifications, change notifications
+    and cache warm-up.
+    
+    Every process runs the scheduler and renews the leader lock; the jobs
+    themselves only run in the leader, so notifications are sent once
+    however many processes serve updates.
     """
     scheduler = AsyncIOScheduler()
     
+    scheduler.add_job(
+        leader.renew,
+        'interval',
+        seconds=max(leader.ttl / 3, 1),
+        id='leader_lock',
+        replace_existing=True
+    )
+    
+    # Warm the cache on startup and at the configured times
+    scheduler.add_job(leader_only(leader, prefetch_schedule), id='prefetch_startup')
+    for run_time in PREFETCH_TIMES:
+        hour, minute = run_time.strip().split(":")
+        scheduler.add_job(
+            leader_only(leader, prefetch_schedule),
+            'cron',
+            hour=int(hour),
+            minute=int(minute),
+            jitter=PREFETCH_JITTER,
+            id=f'prefetch_{hour}{minute}',
+            replace_existing=True
+        )
+    
+    # Push changes of today's and tomorrow's schedule
+    schedule_cache.add_listener(leader_only(
+        leader, lambda previous, current: notify_schedule_changes(bot, db, previous, current)
+    ))
+    scheduler.add_job(
+        leader_only(leader, poll_schedule_changes),
+        'cron',
+        hour='7-22',
+        minute=f'*/{CHANGE_POLL_MINUTES}',
+        id='poll_changes',
+        replace_existing=True
+    )
+    
+    # Reminders before each pair, due ones are taken at the start of every minute
+    reminders = ReminderEngine(bot, db)
+    scheduler.add_job(
+        leader_only(leader, reminders.tick),
+        'cron',
+        minute='*',
+        id='pair_reminders',
+        replace_existing=True
+    )
+    
     # Schedule daily notification at 18:00 (6 PM)
     scheduler.add_job(
-        send_daily_schedule,
+        leader_only(leader, send_daily_schedule),
         'cron',
-        hour=18,
+        hour=DAILY_NOTIFICATION_HOUR,
         minute=0,
         args=[bot, db],
         id='daily_schedule',
@@ -0,0 +1,292 @@
+"""
+State shared by the bot processes: FSM storage, schedule snapshots and the
+scheduler leader lock, kept in SQLite or Redis.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from config import LEADER_LOCK_TTL, REDIS_URL, STATE_BACKEND
+from database import AsyncDatabase, db
+from models import DaySchedule, GroupDay, Lesson, intern_text
+
+
+# Seconds a schedule snapshot is kept in Redis, past dates are not needed
+SNAPSHOT_TTL = 8 * 24 * 3600
+
+# Take the lock if it is free or already ours; both in one step
+ACQUIRE_LOCK_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current == false or current == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Delete the lock only while it is still ours
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def schedule_to_json(day_schedule: DaySchedule, fetched_at: float) -> str:
+    """Serialize a day as {"fetched_at": ..., "shift": ..., "parser_version": ..., "groups": {group: [[pair, subject, room, teacher, subgroup]]}}."""
+    return json.dumps({
+        "fetched_at": fetched_at,
+        "shift": day_schedule.shift,
+        "parser_version": day_schedule.parser_version,
+        "groups": {
+            group: [
+                [lesson.number, lesson.subject, lesson.room, lesson.teacher, lesson.subgroup]
+                for lesson in group_day
+            ]
+            for group, group_day in day_schedule.groups.items()
+        }
+    }, ensure_ascii=False)
+
+
+def schedule_from_json(day: date, value: str) -> Tuple[DaySchedule, float]:
+    """Inverse of schedule_to_json."""
+    data = json.loads(value)
+    groups = {
+        group: GroupDay(intern_text(group), tuple(Lesson.stored(*row) for row in rows))
+        for group, rows in data["groups"].items()
+    }
+    # Snapshots saved before the version was stored come from version 1
+    return DaySchedule(day, groups, data.get("shift", 1), data.get("parser_version", 1)), data["fetched_at"]
+
+
+class StateBackend(ABC):
+    """
+    Key-value store shared by every bot process.
+    
+    Values are strings. Besides plain keys a backend provides a lock that
+    exactly one process holds at a time, and stores schedule snapshots
+    for the schedule cache.
+    """
+    
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Get a value, None if missing or expired."""
+    
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Set a value, kept for ttl seconds or forever if None."""
+    
+    @abstractmethod
+    async def delete(self, key: str):
+        """Delete a value if present."""
+    
+    @abstractmethod
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """Take a lock or extend it if owner holds it, True if owner holds it now."""
+    
+    @abstractmethod
+    async def release_lock(self, name: str, owner: str):
+        """Free a lock if owner still holds it."""
+    
+    @abstractmethod
+    async def save_schedule_day(self, day_schedule: DaySchedule, fetched_at: Optional[float] = None):
+        """Store the snapshot of a day loaded from the site."""
+    
+    @abstractmethod
+    async def get_schedule_day(self, day: date) -> Optional[Tuple[DaySchedule, float]]:
+        """Get the snapshot of a day and the Unix time it was loaded, None if not stored."""
+    
+    async def close(self):
+        pass
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Shared state in the bot's SQLite database.
+    
+    Processes on one host share the database file; WAL mode lets them read
+    while one writes. Schedule snapshots are the existing snapshot tables.
+    The database is closed by its owner, not by the backend.
+    """
+    
+    def __init__(self, database: AsyncDatabase):
+        self.database = database
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await self.database.get_shared_value(key)
+    
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        await self.database.set_shared_value(key, value, expires_at)
+    
+    async def delete(self, key: str):
+        await self.database.delete_shared_value(key)
+    
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        return await self.database.acquire_lock(name, owner, ttl)
+    
+    async def release_lock(self, name: str, owner: str):
+        await self.database.delete_shared_value(name, owner)
+    
+    async def save_schedule_day(self, day_schedule: DaySchedule, fetched_at: Optional[float] = None):
+        await self.database.save_schedule_day(day_schedule, fetched_at)
+    
+    async def get_schedule_day(self, day: date) -> Optional[Tuple[DaySchedule, float]]:
+        return await self.database.get_schedule_day(day)
+
+
+class RedisBackend(StateBackend):
+    """
+    Shared state in Redis, for processes on several hosts.
+    
+    Needs the redis package, imported only when this backend is used.
+    Locks are taken and released with Lua scripts, so the check of the
+    owner and the write are atomic.
+    """
+    
+    def __init__(self, url: str = REDIS_URL, prefix: str = "schedule_bot:"):
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis needs the redis package: pip install redis") from e
+        
+        self.prefix = prefix
+        self.redis = Redis.from_url(url, decode_responses=True)
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await self.redis.get(self.prefix + key)
+    
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self.redis.set(self.prefix + key, value, px=int(ttl * 1000) if ttl is not None else None)
+    
+    async def delete(self, key: str):
+        await self.redis.delete(self.prefix + key)
+    
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(await self.redis.eval(ACQUIRE_LOCK_SCRIPT, 1, self.prefix + name, owner, int(ttl * 1000)))
+    
+    async def release_lock(self, name: str, owner: str):
+        await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, self.prefix + name, owner)
+    
+    async def save_schedule_day(self, day_schedule: DaySchedule, fetched_at: Optional[float] = None):
+        if fetched_at is None:
+            fetched_at = time.time()
+        await self.set(
+            f"schedule:{day_schedule.date.isoformat()}",
+            schedule_to_json(day_schedule, fetched_at),
+            SNAPSHOT_TTL
+        )
+    
+    async def get_schedule_day(self, day: date) -> Optional[Tuple[DaySchedule, float]]:
+        value = await self.get(f"schedule:{day.isoformat()}")
+        return schedule_from_json(day, value) if value is not None else None
+    
+    async def close(self):
+        await self.redis.aclose()
+
+
+class BackendStorage(BaseStorage):
+    """
+    aiogram FSM storage on a state backend.
+    
+    State and data of a chat are stored as two keys, so a user can continue
+    a dialog on whichever process receives the next update.
+    """
+    
+    def __init__(self, backend: StateBackend):
+        self.backend = backend
+        self.key_builder = DefaultKeyBuilder(prefix="fsm")
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key, "state")
+        if state is None:
+            await self.backend.delete(storage_key)
+        else:
+            await self.backend.set(storage_key, state.state if isinstance(state, State) else state)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.backend.get(self.key_builder.build(key, "state"))
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key, "data")
+        if not data:
+            await self.backend.delete(storage_key)
+        else:
+            await self.backend.set(storage_key, json.dumps(data, ensure_ascii=False))
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await self.backend.get(self.key_builder.build(key, "data"))
+        return json.loads(value) if value is not None else {}
+    
+    async def close(self) -> None:
+        pass
+
+
+class LeaderLock:
+    """
+    Lock making one of the bot processes the leader.
+    
+    Every process renews() every few seconds; the one holding the lock
+    keeps it, the others take it over once it expires, i.e. at most ttl
+    seconds after the leader stopped. Jobs that must run once across all
+    processes check is_leader when they fire.
+    """
+    
+    def __init__(self, backend: StateBackend, name: str = "lock:scheduler", ttl: float = LEADER_LOCK_TTL):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._expires = 0.0
+    
+    @property
+    def is_leader(self) -> bool:
+        # A lock whose renewal is overdue is treated as lost
+        return time.monotonic() < self._expires
+    
+    async def renew(self) -> bool:
+        """Take or extend the lock, returns whether this process leads."""
+        started = time.monotonic()
+        was_leader = self.is_leader
+        try:
+            acquired = await self.backend.acquire_lock(self.name, self.owner, self.ttl)
+        except Exception as e:
+            print(f"Error renewing leader lock: {e}")
+            acquired = False
+        
+        self._expires = started + self.ttl if acquired else 0.0
+        if acquired != was_leader:
+            print(f"{self.owner} {'is now' if acquired else 'is no longer'} the scheduler leader")
+        return acquired
+    
+    async def release(self):
+        """Give up the lock so another process takes over right away."""
+        if self._expires:
+            self._expires = 0.0
+            try:
+                await self.backend.release_lock(self.name, self.owner)
+            except Exception as e:
+                print(f"Error releasing leader lock: {e}")
+
+
+def create_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    """Backend selected by STATE_BACKEND."""
+    if kind == "redis":
+        return RedisBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(db)
+    raise ValueError(f"Unknown STATE_BACKEND {kind!r}, expected 'sqlite' or 'redis'")
+
+
+# Shared backend used by the FSM storage, the schedule cache and the scheduler
+state_backend = create_backend()
@@ -0,0 +1,94 @@
+"""
+Test of the schedule change detection on the saved page with a few lessons
+edited. Runs offline.
+"""
+
+from datetime import date
+
+from changes import detect_changes, diff_group_day
+from models import EMPTY_SUBJECT, DaySchedule, GroupDay, Lesson
+from parser import parse_day_page
+
+
+FIXTURE = "working_schedule.html"
+
+
+def edited(group_day: GroupDay, pair: int, *lessons: Lesson) -> GroupDay:
+    """The group's day with the lessons of one pair replaced."""
+    kept = [lesson for lesson in group_day if lesson.number != pair]
+    return GroupDay(group_day.group, tuple(sorted(kept + list(lessons), key=lambda l: (l.number, l.subgroup))))
+
+
+def assert_lines(old: GroupDay, new: GroupDay, expected: dict):
+    """expected maps a subgroup to its exact change lines."""
+    for subgroup, lines in expected.items():
+        actual = diff_group_day(old, new, subgroup)
+        assert actual == lines, f"subgroup {subgroup}: {actual}"
+
+
+def test_changes():
+    print("🧪 Testing change detection\n")
+    print("=" * 50)
+    
+    with open(FIXTURE, 'rb') as f:
+        groups = parse_day_page(f.read())
+    # I: Геология (нет), II: Инж.график split (№30 / №7), III: Материал-е (№9)
+    eks = groups["ЭКС-1-24"]
+    # I: Инфор-ка split (№60 / №58), II and III: Пары нет
+    m25 = groups["М-25"]
+    
+    # A room change of one subgroup reaches only that subgroup
+    room_changed = edited(
+        eks, 2,
+        Lesson.stored(2, "Инж.график", "№30", "Горбачева В.М.", 1),
+        Lesson.stored(2, "Инж.график", "№14", "Павлова Е.Н.", 2)
+    )
+    line = "II пара (2 п/гр): аудитория №7 → №14"
+    assert_lines(eks, room_changed, {0: [line], 1: [], 2: [line]})
+    print("🚪 Subgroup room change")
+    
+    # A whole-group pair split into subgroups
+    split = edited(
+        eks, 3,
+        Lesson.stored(3, "Материал-е", "№9", "Вологодская И.А.", 1),
+        Lesson.stored(3, "Физ-ра", "Спортзал", "Ершов П.П.", 2)
+    )
+    cancelled = "III пара: отменена Материал-е (№9)"
+    first = "III пара (1 п/гр): добавлена Материал-е (№9)"
+    second = "III пара (2 п/гр): добавлена Физ-ра (Спортзал)"
+    assert_lines(eks, split, {0: [cancelled, first, second], 1: [cancelled, first], 2: [cancelled, second]})
+    print("✂️ Pair split into subgroups")
+    
+    # A pair that is no longer held
+    no_pair = edited(eks, 1, Lesson.stored(1, EMPTY_SUBJECT))
+    assert_lines(eks, no_pair, {0: ["I пара: отменена Геология (нет)"], 1: ["I пара: отменена Геология (нет)"]})
+    
+    # An empty pair split into empty subgroups is not a change, a lesson
+    # added for one subgroup is
+    empty_split = edited(m25, 2, Lesson.stored(2, EMPTY_SUBJECT, subgroup=1), Lesson.stored(2, EMPTY_SUBJECT, subgroup=2))
+    assert_lines(m25, empty_split, {0: [], 1: [], 2: []})
+    added = edited(m25, 3, Lesson.stored(3, "Химия", "№12", "Ким А.А.", 1))
+    assert_lines(m25, added, {0: ["III пара (1 п/гр): добавлена Химия (№12)"], 1: ["III пара (1 п/гр): добавлена Химия (№12)"], 2: []})
+    print("🚫 Cancelled and added pairs")
+    
+    # Teacher change, with Markdown characters from the site escaped
+    teacher = edited(eks, 3, Lesson.stored(3, "Материал-е", "№9", "Иванов_И.И.", 0))
+    assert diff_group_day(eks, teacher, parse_mode="Markdown") == [
+        "III пара: преподаватель Вологодская И.А. → Иванов\\_И.И."
+    ]
+    assert diff_group_day(eks, teacher) == ["III пара: преподаватель Вологодская И.А. → Иванов_И.И."]
+    print("👤 Teacher change, escaped for Markdown")
+    
+    # Only the edited groups are reported for the whole day
+    day = date(2025, 10, 6)
+    before = DaySchedule(day, groups)
+    after = DaySchedule(day, {**groups, "ЭКС-1-24": room_changed, "М-25": empty_split})
+    assert detect_changes(before, after) == {"ЭКС-1-24": [line]}
+    assert detect_changes(before, before) == {}
+    print(f"📅 {len(groups)} groups compared, one changed")
+    
+    print("\n✅ Changes are detected per subgroup!")
+
+
+if __name__ == "__main__":
+    test_changes()
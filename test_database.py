@@ -0,0 +1,58 @@
+"""
+Test of the database thread while another process holds the write lock,
+simulated by a second connection to the same temporary file. Runs offline.
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from database import AsyncDatabase, Database
+
+
+async def run_database_test():
+    path = os.path.join(tempfile.mkdtemp(), "locked.db")
+    database = AsyncDatabase(Database(path, busy_timeout=0.5))
+    await database.set_default_group(1, "ИС-1-24")
+    
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        # Reads do not wait for the writer
+        started = time.monotonic()
+        reads = await asyncio.gather(database.get_default_group(1), database.get_user_profile(1))
+        assert reads[0] == "ИС-1-24" and reads[1].default_group == "ИС-1-24"
+        assert time.monotonic() - started < 0.4
+        print("📖 Reads go on while another process holds the write lock")
+        
+        # A write waits for the lock, then fails instead of hanging
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(database.set_default_group(1, "ИС-2-24"), 5)
+        except sqlite3.OperationalError as e:
+            assert "locked" in str(e), e
+        else:
+            raise AssertionError("write succeeded while another process held the lock")
+        print(f"🔒 Write failed after {time.monotonic() - started:.1f} s with the lock held elsewhere")
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    
+    # The thread keeps serving calls once the lock is free
+    await database.set_default_group(1, "ИС-2-24")
+    assert await database.get_default_group(1) == "ИС-2-24"
+    print("✅ Calls succeed again once the lock is released")
+    await database.close()
+
+
+def test_database():
+    print("🧪 Testing the database under a busy write lock\n")
+    print("=" * 50)
+    asyncio.run(run_database_test())
+    print("\n✅ Callers get an error instead of waiting forever!")
+
+
+if __name__ == "__main__":
+    test_database()
@@ -0,0 +1,61 @@
+"""
+Test of the group registry shared by two bot processes, simulated by two
+connections to one temporary database. Runs offline.
+"""
+
+import asyncio
+import os
+import tempfile
+from datetime import date
+
+from database import AsyncDatabase, Database
+from groups import GroupRegistry
+from models import DaySchedule, GroupDay
+
+
+SEED = ["ИС-1-24", "ИС-2-24"]
+
+
+def page(*groups: str) -> DaySchedule:
+    """A day page with the given header groups."""
+    return DaySchedule(date(2025, 10, 6), {group: GroupDay(group) for group in groups})
+
+
+async def run_groups_test():
+    path = os.path.join(tempfile.mkdtemp(), "groups.db")
+    databases = [AsyncDatabase(Database(path)) for _ in range(2)]
+    first, second = [GroupRegistry(database, seed=SEED) for database in databases]
+    
+    # Both seed the empty registry at once, the seed is stored once
+    await asyncio.gather(first.load(), second.load())
+    assert first.groups == second.groups == tuple(SEED)
+    print("🌱 Seeded once")
+    
+    # Each process finds a different new group at the same time
+    await asyncio.gather(first.observe(page("ИС-1-24", "ИС-1-26")), second.observe(page("ИС-2-24", "ИС-2-26")))
+    await first.load()
+    await second.load()
+    assert set(first.groups) == set(SEED + ["ИС-1-26", "ИС-2-26"]), first.groups
+    assert first.groups == second.groups and first.version == second.version
+    
+    # Positions are append-only: known groups keep theirs
+    assert first.groups[:len(SEED)] == tuple(SEED)
+    before = first.groups
+    await second.observe(page("ИС-1-26", "ПГ-26"))
+    assert second.groups[:len(before)] == before and second.groups[-1] == "ПГ-26"
+    assert second.version > first.version
+    print(f"📚 Both processes see {len(second.groups)} groups at the same positions")
+    
+    for database in databases:
+        await database.close()
+
+
+def test_groups():
+    print("🧪 Testing the shared group registry\n")
+    print("=" * 50)
+    asyncio.run(run_groups_test())
+    print("\n✅ Group positions agree between processes!")
+
+
+if __name__ == "__main__":
+    test_groups()
@@ -0,0 +1,41 @@
+"""
+Parity test for the schedule parser backends.
+Runs offline against the saved page.
+"""
+
+from parser import parse_day_page
+
+
+# The other saved pages have no schedule table, both backends return None
+FIXTURE = "working_schedule.html"
+EXPECTED_GROUPS = 45
+
+
+def test_parser_backends():
+    """Both backends must return identical, non-empty lessons for the saved page."""
+    print("🧪 Testing parser backends\n")
+    print("=" * 50)
+    
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    
+    bs4_schedule = parse_day_page(content, backend="bs4")
+    lxml_schedule = parse_day_page(content, backend="lxml")
+    
+    assert bs4_schedule, f"No groups parsed from {FIXTURE}"
+    assert len(bs4_schedule) == EXPECTED_GROUPS, f"Expected {EXPECTED_GROUPS} groups, got {len(bs4_schedule)}"
+    assert "ИС-1-24" in bs4_schedule and "ЭКС-1-24" in bs4_schedule
+    
+    # A split pair comes out as one lesson per subgroup
+    split = [(lesson.number, lesson.subgroup) for lesson in bs4_schedule["ЭКС-1-24"]]
+    assert split == [(1, 0), (2, 1), (2, 2), (3, 0)], split
+    
+    lessons = sum(len(group_day) for group_day in bs4_schedule.values())
+    print(f"📄 {FIXTURE}: {len(bs4_schedule)} groups, {lessons} lessons")
+    assert lxml_schedule == bs4_schedule, f"Backends differ on {FIXTURE}"
+    
+    print("\n✅ Backends return identical output!")
+
+
+if __name__ == "__main__":
+    test_parser_backends()
@@ -0,0 +1,93 @@
+"""
+Test of the pair reminders against the saved page and a local fake of the
+Telegram Bot API. Runs offline.
+"""
+
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+
+from database import AsyncDatabase, Database
+from fake_telegram import FakeTelegram
+from models import DaySchedule
+from parser import get_target_date, parse_day_page
+from reminders import ReminderEngine, ReminderQueue, pair_start
+from schedule_cache import ScheduleCache
+
+
+FIXTURE = "working_schedule.html"
+
+
+async def run_reminders_test():
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    day = get_target_date(0)
+    day_schedule = DaySchedule(day, parse_day_page(content))
+    
+    async def loader(_):
+        return day_schedule
+    
+    cache = ScheduleCache(loader=loader)
+    await cache.get_day(day)
+    
+    database = AsyncDatabase(Database(os.path.join(tempfile.mkdtemp(), "reminders.db")))
+    # ЭКС-1-24 has a split pair II, ГП-2-25 has no pair I
+    users = [(1, "ЭКС-1-24", 0), (2, "ЭКС-1-24", 1), (3, "ЭКС-1-24", 2), (4, "ЭКС-1-24", 0), (5, "ГП-2-25", 0)]
+    for user_id, group, subgroup in users:
+        await database.set_default_group(user_id, group)
+        await database.set_subgroup(user_id, subgroup)
+        await database.set_reminders(user_id, user_id != 4)
+    
+    queue = ReminderQueue(day_schedule)
+    pairs = sum(len({lesson.number for lesson in group_day if not lesson.is_empty}) for group_day in day_schedule.groups.values())
+    assert len(queue) == pairs
+    print(f"⏰ {len(queue)} reminders queued for {len(day_schedule.groups)} groups")
+    
+    fake = FakeTelegram(port=8083)
+    await fake.start()
+    bot = fake.bot()
+    engine = ReminderEngine(bot, database, cache)
+    
+    def at(pair, minutes_before=10):
+        starts_at = datetime.combine(day, pair_start(1, pair))
+        return starts_at.replace(minute=starts_at.minute - minutes_before) if minutes_before else starts_at
+    
+    def received():
+        chats = sorted(chat_id for _, chat_id, _ in fake.sent)
+        fake.sent.clear()
+        return chats
+    
+    await engine.tick(at(1))
+    assert received() == [1, 2, 3], "pair I goes to ЭКС-1-24 only, user 4 has reminders off"
+    
+    await engine.tick(at(1))
+    assert received() == [], "a reminder is sent once"
+    
+    await engine.tick(at(2))
+    texts = {chat_id: text for _, chat_id, text in fake.sent}
+    assert received() == [1, 2, 3, 5]
+    assert "1 п/гр" in texts[1] and "2 п/гр" in texts[1], texts[1]
+    assert "1 п/гр" in texts[2] and "2 п/гр" not in texts[2], texts[2]
+    assert "2 п/гр" in texts[3] and "1 п/гр" not in texts[3], texts[3]
+    print("👥 Split pairs reach each subgroup with its own lesson")
+    
+    # A pair that already started is skipped, e.g. after a restart
+    await engine.tick(at(4, minutes_before=0).replace(minute=5))
+    assert received() == []
+    print("⏭ Pairs already started are skipped")
+    
+    await bot.session.close()
+    await fake.stop()
+    await database.close()
+
+
+def test_reminders():
+    print("🧪 Testing pair reminders\n")
+    print("=" * 50)
+    asyncio.run(run_reminders_test())
+    print("\n✅ Reminders work!")
+
+
+if __name__ == "__main__":
+    test_reminders()
@@ -0,0 +1,103 @@
+"""
+Test of the shared state backends with two bot processes simulated by two
+clients of the same store. Runs offline: SQLite on a temporary file, Redis
+on the local stand-in (skipped if the redis package is not installed).
+"""
+
+import asyncio
+import os
+import tempfile
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database import AsyncDatabase, Database
+from fake_redis import FakeRedis
+from models import DaySchedule
+from parser import get_target_date, parse_day_page
+from schedule_cache import ScheduleCache
+from state import BackendStorage, LeaderLock, RedisBackend, SQLiteBackend
+
+
+FIXTURE = "working_schedule.html"
+
+
+async def check_backends(first, second):
+    # FSM state written by one process is read by the other
+    key = StorageKey(bot_id=1, chat_id=1000, user_id=1000)
+    await BackendStorage(first).set_state(key, "UserStates:waiting_for_teacher")
+    await BackendStorage(first).update_data(key, {"group": "ИС-1-24"})
+    assert await BackendStorage(second).get_state(key) == "UserStates:waiting_for_teacher"
+    assert await BackendStorage(second).get_data(key) == {"group": "ИС-1-24"}
+    await BackendStorage(second).set_state(key, None)
+    assert await BackendStorage(first).get_state(key) is None
+    print("   📝 FSM state shared")
+    
+    # Exactly one leader; the other takes over after release or expiry
+    leader_a = LeaderLock(first, ttl=0.3)
+    leader_b = LeaderLock(second, ttl=0.3)
+    assert await leader_a.renew() and not await leader_b.renew()
+    assert await leader_a.renew() and not await leader_b.renew()
+    await leader_a.release()
+    assert await leader_b.renew() and not await leader_a.renew()
+    await asyncio.sleep(0.4)
+    assert not leader_b.is_leader
+    assert await leader_a.renew() and not await leader_b.renew()
+    await leader_a.release()
+    print("   👑 One leader at a time")
+    
+    # A day loaded by one process is served to the other without a fetch
+    with open(FIXTURE, 'rb') as f:
+        day_schedule = DaySchedule(get_target_date(1), parse_day_page(f.read()))
+    loads = []
+    
+    async def loader(day):
+        loads.append(day)
+        return day_schedule
+    
+    cache_a = ScheduleCache(loader=loader, store=first)
+    cache_b = ScheduleCache(loader=loader, store=second)
+    assert await cache_a.get_day(day_schedule.date) is day_schedule
+    shared = await cache_b.get_day(day_schedule.date)
+    assert shared == day_schedule and loads == [day_schedule.date]
+    
+    # Another process reloading first is picked up instead of a second fetch
+    await asyncio.sleep(0.01)
+    await cache_a.refresh(day_schedule.date)
+    assert len(loads) == 2
+    await cache_b.refresh(day_schedule.date)
+    assert len(loads) == 2
+    print("   📅 Schedule loaded once for both processes")
+
+
+async def run_state_test():
+    print("🗄 SQLite")
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    databases = [AsyncDatabase(Database(path)) for _ in range(2)]
+    await check_backends(*[SQLiteBackend(database) for database in databases])
+    for database in databases:
+        await database.close()
+    
+    print("🟥 Redis (local stand-in)")
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        print("   ⚠️ redis package not installed, skipped")
+        return
+    server = FakeRedis()
+    await server.start()
+    backends = [RedisBackend(server.url) for _ in range(2)]
+    await check_backends(*backends)
+    for backend in backends:
+        await backend.close()
+    await server.stop()
+
+
+def test_state():
+    print("🧪 Testing shared state backends\n")
+    print("=" * 50)
+    asyncio.run(run_state_test())
+    print("\n✅ State is shared between processes!")
+
+
+if __name__ == "__main__":
+    test_state()
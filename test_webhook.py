@@ -0,0 +1,105 @@
+"""
+Test of the webhook mode against a local fake of the Telegram Bot API.
+Runs offline.
+"""
+
+import asyncio
+
+import aiohttp
+from aiogram import Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+
+from fake_telegram import FakeTelegram
+from webhook import UpdateWorkers, build_webhook_app
+
+
+WEBHOOK_PORT = 8082
+SECRET = "test-secret"
+
+
+def echo_dispatcher(workers: UpdateWorkers) -> Dispatcher:
+    router = Router()
+    
+    @router.message()
+    async def echo(message: Message):
+        await asyncio.sleep(0.05)
+        await message.answer(f"echo: {message.text}")
+    
+    dp = Dispatcher()
+    dp.update.outer_middleware(workers)
+    dp.include_router(router)
+    return dp
+
+
+async def run_webhook_test():
+    fake = FakeTelegram()
+    await fake.start()
+    bot = fake.bot()
+    workers = UpdateWorkers(workers=2)
+    dp = echo_dispatcher(workers)
+    
+    shutdown_in_flight = []
+    
+    @dp.shutdown()
+    async def on_shutdown():
+        await workers.drain()
+        shutdown_in_flight.append(workers.in_flight)
+    
+    # Webhook mode refuses to start without a secret
+    try:
+        build_webhook_app(bot, dp, path="/webhook", secret="")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("webhook app built without a secret")
+    
+    runner = web.AppRunner(build_webhook_app(bot, dp, path="/webhook", secret=SECRET))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", WEBHOOK_PORT).start()
+    webhook_url = f"http://127.0.0.1:{WEBHOOK_PORT}/webhook"
+    
+    try:
+        # Requests without the secret token are rejected
+        async with aiohttp.ClientSession() as session:
+            update = fake.message_update("intruder")
+            async with session.post(webhook_url, json=update) as response:
+                assert response.status == 401, response.status
+            headers = {"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+            async with session.post(webhook_url, json=update, headers=headers) as response:
+                assert response.status == 401, response.status
+        print("🔒 Requests without the secret are rejected")
+        
+        await bot.set_webhook(webhook_url, secret_token=SECRET)
+        assert fake.webhook_url == webhook_url
+        
+        status = await fake.push_message("hello")
+        assert status == 200, status
+        await fake.wait_reply("echo: hello")
+        print("📨 Update answered through the webhook")
+        
+        # More updates than workers: acknowledged at once, answered in turn
+        for number in range(6):
+            assert await fake.push_message(f"burst {number}") == 200
+        assert workers.in_flight > 0
+    finally:
+        # Shutdown waits for the burst before the bot session is closed
+        await runner.cleanup()
+    
+    await fake.stop()
+    assert shutdown_in_flight == [0], shutdown_in_flight
+    texts = {text for _, _, text in fake.sent}
+    assert all(f"echo: burst {number}" in texts for number in range(6)), texts
+    assert "echo: intruder" not in texts
+    print("🛑 Updates in flight answered before shutdown")
+
+
+def test_webhook():
+    print("🧪 Testing webhook mode\n")
+    print("=" * 50)
+    asyncio.run(run_webhook_test())
+    print("\n✅ Webhook mode works!")
+
+
+if __name__ == "__main__":
+    test_webhook()
@@ -0,0 +1,155 @@
+"""
+Webhook runtime and the update worker limit shared with polling.
+"""
+
+import asyncio
+import signal
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import UPDATE_WORKERS, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+
+
+class UpdateWorkers(BaseMiddleware):
+    """
+    Outer update middleware that limits how many updates are handled at once.
+    
+    Both polling and the webhook start a task per update. Tasks above the
+    limit wait for a free worker instead of all hitting the site and the
+    database together. drain() waits until every started update is done.
+    """
+    
+    def __init__(self, workers: int = UPDATE_WORKERS):
+        self.workers = workers
+        self._semaphore = asyncio.Semaphore(workers)
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+    
+    @property
+    def in_flight(self) -> int:
+        """Updates being handled or waiting for a worker."""
+        return self._in_flight
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+    
+    async def drain(self, timeout: float = 30):
+        """Wait for the updates in flight, at most timeout seconds."""
+        # Let tasks created for the last requests reach the middleware
+        await asyncio.sleep(0)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Shutdown with {self._in_flight} updates still in flight")
+
+
+def build_webhook_app(
+    bot: Bot,
+    dp: Dispatcher,
+    path: str = WEBHOOK_PATH,
+    secret: str = WEBHOOK_SECRET
+) -> web.Application:
+    """
+    Create the aiohttp application that receives updates from Telegram.
+    
+    Requests without the secret token are rejected with 401. Updates are
+    acknowledged right away and handled in the background.
+    
+    Raises:
+        ValueError: If the secret is empty, the endpoint would accept
+            updates from anyone who finds its URL
+    
+    Args:
+        bot: Bot the updates are for
+        dp: Dispatcher with the routers
+        path: URL path Telegram posts to
+        secret: Secret token set with setWebhook
+    
+    Returns:
+        Application with the webhook route and startup/shutdown hooks
+    """
+    if not secret:
+        raise ValueError("WEBHOOK_SECRET not set. Webhook mode needs it, please set it in .env file.")
+    
+    app = web.Application()
+    
+    # The dispatcher's shutdown hooks are registered first so they run
+    # (and can drain the updates in flight) before the request handler
+    # closes the bot session
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret
+    ).register(app, path=path)
+    return app
+
+
+async def run_webhook(
+    bot: Bot,
+    dp: Dispatcher,
+    workers: UpdateWorkers,
+    url: str = WEBHOOK_URL,
+    host: str = WEBHOOK_HOST,
+    port: int = WEBHOOK_PORT,
+    stop: Optional[asyncio.Event] = None
+):
+    """
+    Register the webhook with Telegram and serve it until stopped.
+    
+    SIGINT and SIGTERM stop the server: new requests are refused, then the
+    dispatcher's shutdown hooks run and the bot session is closed.
+    
+    Args:
+        bot: Bot the updates are for
+        dp: Dispatcher with the routers
+        workers: Worker limit, also used as setWebhook max_connections
+        url: Public base URL, the webhook is not registered if empty
+        host: Address to listen on
+        port: Port to listen on
+        stop: Event that stops the server when set, signals are used if None
+    """
+    app = build_webhook_app(bot, dp)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"Webhook server listening on {host}:{port}{WEBHOOK_PATH}")
+    
+    if url:
+        await bot.set_webhook(
+            f"{url.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(workers.workers, 100)
+        )
+    
+    if stop is None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+    
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()